@@ -1,13 +1,54 @@
+import argparse
 import arxiv
 import requests
 import os
-import json
 from tqdm import tqdm
 from datetime import datetime
 from enum import Enum
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Any
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from urllib.parse import urlparse
+import queue
+import threading
 import time
+import re
+
+import citation_cache
+import file_manifest
+import http_client
+import job_checkpoint
+import paper_db
+import paper_identity
+import pdf_fetcher
+import pdf_store
+import rate_limiter
+import retry_queue
+
+# 并发下载配置
+DOWNLOAD_WORKERS = 8            # 下载线程池大小
+MAX_DOWNLOADS_PER_HOST = 4      # 同一主机的最大并发下载数
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+_arxiv_client = None
+_arxiv_client_lock = threading.Lock()
+
+# Semantic Scholar批量查询配置
+S2_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
+S2_BATCH_LIMIT = 500            # 批量接口单次最多查询的论文数
+CITATION_BATCH_SIZE = 100       # 搜索时每积累多少篇论文查询一次引用数
+
+# 版本更新检查配置
+ID_LIST_BATCH_SIZE = 100        # 每次arXiv id_list查询的论文数
+
+# 流水线配置
+ENRICH_WORKERS = 2              # 同时进行的引用查询批次数
+SEARCH_QUEUE_SIZE = 500         # 搜索阶段预取的最大论文数
+BATCH_WAIT_SECONDS = 2          # 批次未满时最多等待搜索结果的时间（秒）
+SEARCH_DONE = object()          # 搜索阶段结束标记
 
 class SortOrder(Enum):
     """论文排序方式"""
@@ -39,27 +80,48 @@ class SearchCriteria:
     sort_by: SortOrder = SortOrder.RELEVANCE  # 排序方式
     max_results: int = 20                  # 最大结果数
 
+class SharedArxivClient(arxiv.Client):
+    """可在多个线程间共用的arXiv客户端：翻页请求串行进行，多个任务同时搜索时也保持arXiv要求的请求间隔"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # arxiv库的_parse_feed在出错重试时会递归调用自身，必须使用可重入锁
+        self._request_lock = threading.RLock()
+    
+    def _parse_feed(self, *args, **kwargs):
+        with self._request_lock:
+            return super()._parse_feed(*args, **kwargs)
+
+def get_arxiv_client() -> arxiv.Client:
+    """进程内所有arXiv搜索共用的客户端"""
+    global _arxiv_client
+    with _arxiv_client_lock:
+        if _arxiv_client is None:
+            _arxiv_client = SharedArxivClient()
+        return _arxiv_client
+
 def load_paper_database(db_path):
-    """加载论文数据库"""
-    if os.path.exists(db_path):
-        with open(db_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"papers": {}}
+    """加载论文数据库（JSON或SQLite，见paper_db）"""
+    return paper_db.open_paper_store(db_path)
 
-def save_paper_database(db_path, data):
-    """保存论文数据库"""
-    with open(db_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def save_paper_database(db, paper_id, record):
+    """保存一篇论文的记录"""
+    db.put(paper_id, record)
 
 def get_citation_count(title, authors, max_retries=3):
-    """从Semantic Scholar获取论文引用次数"""
+    """从Semantic Scholar获取论文引用次数（先查本地缓存）"""
+    cache = citation_cache.get_default_cache()
+    cached = cache.get(citation_cache.title_key(title))
+    if cached is not None:
+        return cached
+    
     try:
         base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
         headers = {
             "Accept": "application/json"
         }
         
-        for _ in range(max_retries):
+        for attempt in range(max_retries):
             try:
                 params = {
                     "query": title,
@@ -67,25 +129,201 @@ def get_citation_count(title, authors, max_retries=3):
                     "limit": 1
                 }
                 
-                response = requests.get(base_url, headers=headers, params=params)
+                response = http_client.get(base_url, headers=headers, params=params)
                 response.raise_for_status()
                 data = response.json()
                 
                 if data["data"] and len(data["data"]) > 0:
                     paper_data = data["data"][0]
                     if title.lower() in paper_data["title"].lower():
-                        return {
+                        citation_info = {
                             "citation_count": paper_data.get("citationCount", 0),
-                            "semantic_scholar_url": f"https://www.semanticscholar.org/paper/{paper_data['paperId']}"
+                            "semantic_scholar_url": f"https://www.semanticscholar.org/paper/{paper_data['paperId']}",
+                            "year": paper_data.get("year")
                         }
+                        cache.put([citation_cache.title_key(title), citation_cache.s2_key(paper_data['paperId'])],
+                                  **citation_info)
+                        return citation_info
+                
+                # 确认查不到的论文也缓存，避免每次都重新搜索
+                cache.put([citation_cache.title_key(title)], 0, None)
                 return {"citation_count": 0, "semantic_scholar_url": None}
                 
             except Exception as e:
+                # 限速由http_client统一处理，这里只对其他错误退避
+                time.sleep(rate_limiter.backoff_delay(attempt))
                 continue
     except Exception as e:
         print(f"获取引用信息时出错: {str(e)}")
     return {"citation_count": 0, "semantic_scholar_url": None}
 
+def get_arxiv_base_id(paper_id: str) -> str:
+    """去掉arXiv ID的版本号，如 2301.01234v3 -> 2301.01234"""
+    return re.sub(r'v\d+$', '', paper_id)
+
+def get_arxiv_version(paper_id: str) -> int:
+    """arXiv ID中的版本号，没有版本号时视为第1版"""
+    match = re.search(r'v(\d+)$', paper_id)
+    return int(match.group(1)) if match else 1
+
+def get_stored_version(paper_id: str, record: Dict) -> int:
+    """数据库记录中已下载的最新版本（兼容以带版本号的ID为键的旧记录）"""
+    return record.get("version") or get_arxiv_version(record.get("arxiv_id") or paper_id)
+
+def build_paper_record(paper, citation_info: Dict, filename: str,
+                       previous: Optional[Dict] = None, previous_id: Optional[str] = None,
+                       sha256: Optional[str] = None) -> Dict:
+    """
+    生成以arXiv基础ID为键的数据库记录
+
+    参数:
+        paper: arXiv论文
+        citation_info: 引用信息
+        filename: 本版本的PDF文件名
+        previous: 同一篇论文已有的记录（下载新版本时），其版本历史会被保留
+        previous_id: 已有记录的数据库键
+        sha256: PDF在内容存储中的哈希（见pdf_store）
+    返回:
+        记录字典，versions字段按版本顺序保存每个版本的文件名和下载日期
+    """
+    versions = list(previous.get("versions") or []) if previous else []
+    if previous and not versions:
+        # 旧记录没有版本历史，把它作为历史中的第一项
+        versions.append({
+            "version": get_stored_version(previous_id or "", previous),
+            "filename": previous.get("filename"),
+            "downloaded_date": previous.get("downloaded_date"),
+            "sha256": previous.get("sha256")
+        })
+    version = get_arxiv_version(paper.get_short_id())
+    versions.append({
+        "version": version,
+        "updated_date": paper.updated.strftime("%Y-%m-%d"),
+        "filename": filename,
+        "downloaded_date": datetime.now().strftime("%Y-%m-%d"),
+        "sha256": sha256
+    })
+    return {
+        "title": paper.title,
+        "authors": [str(author) for author in paper.authors],
+        "abstract": paper.summary,
+        "citation_count": citation_info["citation_count"],
+        "semantic_scholar_url": citation_info["semantic_scholar_url"],
+        "published_date": paper.published.strftime("%Y-%m-%d"),
+        "downloaded_date": datetime.now().strftime("%Y-%m-%d"),
+        "filename": filename,
+        "sha256": sha256,
+        "arxiv_url": paper.pdf_url,
+        "categories": paper.categories,
+        "doi": paper.doi,
+        "identifiers": get_identity_keys(paper, citation_info),
+        "arxiv_id": get_arxiv_base_id(paper.get_short_id()),
+        "version": version,
+        "versions": versions
+    }
+
+def paper_to_dict(paper) -> Dict:
+    """把arXiv论文转换为可保存到检查点的字典"""
+    return {
+        "entry_id": paper.entry_id,
+        "updated": paper.updated.isoformat(),
+        "published": paper.published.isoformat(),
+        "title": paper.title,
+        "authors": [str(author) for author in paper.authors],
+        "summary": paper.summary,
+        "comment": paper.comment,
+        "journal_ref": paper.journal_ref,
+        "doi": paper.doi,
+        "primary_category": paper.primary_category,
+        "categories": paper.categories,
+        "pdf_url": paper.pdf_url
+    }
+
+def paper_from_dict(data: Dict) -> arxiv.Result:
+    """由paper_to_dict的结果恢复arXiv论文"""
+    links = [arxiv.Result.Link(data["pdf_url"], title="pdf", rel="related", content_type="application/pdf")] \
+        if data.get("pdf_url") else []
+    return arxiv.Result(
+        entry_id=data["entry_id"],
+        updated=datetime.fromisoformat(data["updated"]),
+        published=datetime.fromisoformat(data["published"]),
+        title=data["title"],
+        authors=[arxiv.Result.Author(name) for name in data["authors"]],
+        summary=data["summary"],
+        comment=data.get("comment"),
+        journal_ref=data.get("journal_ref"),
+        doi=data.get("doi"),
+        primary_category=data.get("primary_category"),
+        categories=data.get("categories"),
+        links=links
+    )
+
+def get_identity_keys(paper, citation_info: Optional[Dict] = None) -> List[str]:
+    """arXiv论文的身份键，已查到引用信息时加上Semantic Scholar paperId"""
+    s2_id = citation_cache.s2_id_from_url(citation_info.get("semantic_scholar_url")) if citation_info else None
+    return paper_identity.build_keys(paper.get_short_id(), s2_id, paper.doi, paper.title)
+
+def get_citation_counts(papers, max_retries=3) -> List[Dict]:
+    """
+    通过Semantic Scholar批量接口按arXiv ID获取引用次数
+    
+    参数:
+        papers: arXiv论文列表
+    返回:
+        与papers一一对应的引用信息列表。先查本地缓存，
+        缓存未命中的论文走批量接口，批量接口查不到的再回退到标题搜索
+    """
+    cache = citation_cache.get_default_cache()
+    results = [
+        cache.get(citation_cache.arxiv_key(paper.get_short_id()), citation_cache.title_key(paper.title))
+        for paper in papers
+    ]
+    missing = [i for i, citation_info in enumerate(results) if citation_info is None]
+    headers = {
+        "Accept": "application/json"
+    }
+    
+    for start in range(0, len(missing), S2_BATCH_LIMIT):
+        chunk = missing[start:start + S2_BATCH_LIMIT]
+        ids = [f"ARXIV:{get_arxiv_base_id(papers[i].get_short_id())}" for i in chunk]
+        
+        for attempt in range(max_retries):
+            try:
+                response = http_client.post(
+                    S2_BATCH_URL,
+                    headers=headers,
+                    params={"fields": "title,citationCount,year"},
+                    json={"ids": ids}
+                )
+                response.raise_for_status()
+                
+                # 返回结果与请求的ID顺序一致，查不到的为null
+                for i, paper_data in zip(chunk, response.json()):
+                    if paper_data and paper_data.get("paperId"):
+                        results[i] = {
+                            "citation_count": paper_data.get("citationCount") or 0,
+                            "semantic_scholar_url": f"https://www.semanticscholar.org/paper/{paper_data['paperId']}",
+                            "year": paper_data.get("year")
+                        }
+                        cache.put([
+                            citation_cache.arxiv_key(papers[i].get_short_id()),
+                            citation_cache.s2_key(paper_data["paperId"]),
+                            citation_cache.title_key(papers[i].title)
+                        ], **results[i])
+                break
+                
+            except Exception as e:
+                time.sleep(rate_limiter.backoff_delay(attempt))
+                continue
+    
+    # 批量接口查不到的论文使用标题搜索兜底
+    for i, paper in enumerate(papers):
+        if results[i] is None:
+            results[i] = get_citation_count(paper.title, [str(author) for author in paper.authors])
+    
+    cache.save()
+    return results
+
 def get_safe_filename(authors, title):
     """
     生成安全的文件名：作者姓氏-论文标题
@@ -347,7 +585,15 @@ def create_download_session_dir(base_dir: str, criteria: SearchCriteria) -> tupl
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     session_name = f"{topic}_{timestamp}"
     session_dir = os.path.join(base_dir, session_name)
-    os.makedirs(session_dir)
+    # 批量任务可能在同一秒内创建主题相同的会话目录
+    suffix = 1
+    while True:
+        try:
+            os.makedirs(session_dir)
+            break
+        except FileExistsError:
+            suffix += 1
+            session_dir = os.path.join(base_dir, f"{session_name}_{suffix}")
     
     # 创建说明文件
     readme_path = os.path.join(session_dir, "download_info.md")
@@ -382,41 +628,150 @@ def update_download_info(readme_path: str, paper, citation_info: dict, index: in
         
         f.write(f"| {index} | {paper.title} | {authors} | {pub_date} | {citations} |\n")
 
-def download_paper(url, filepath, max_retries=3):
-    """下载论文PDF，支持重试"""
+def download_paper(url, filepath, max_retries=3) -> Optional[Exception]:
+    """
+    下载论文PDF，支持重试（流式写入，完成后原子重命名）
+    
+    返回:
+        成功时返回None，失败时返回最后一次的异常（用于记入重试队列）
+    """
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            pdf_fetcher.stream_pdf(url, filepath)
+            return None
             
-            # 验证是否为PDF文件
-            if 'application/pdf' in response.headers.get('content-type', ''):
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                return True
-            else:
-                print(f"下载的文件不是PDF格式")
-                return False
+        except pdf_fetcher.NotPdfError as e:
+            print(str(e))
+            return e
                 
         except requests.exceptions.RequestException as e:
             if attempt < max_retries - 1:
                 print(f"下载失败，正在重试 ({attempt + 1}/{max_retries})")
-                time.sleep(2 ** attempt)  # 指数退避
+                time.sleep(rate_limiter.backoff_delay(attempt))  # 带抖动的指数退避
             else:
                 print(f"下载PDF失败: {str(e)}")
-                return False
-    return False
+                return e
+    # max_retries不大于0时一次也没有下载，不能当作成功
+    return ValueError(f"没有尝试下载（max_retries={max_retries}）")
+
+def get_host_semaphore(url: str, limit: int = MAX_DOWNLOADS_PER_HOST) -> threading.BoundedSemaphore:
+    """获取URL所属主机的并发信号量（同一主机共享一个）"""
+    host = urlparse(url).netloc
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(limit)
+        return _host_semaphores[host]
 
-def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_path="papers_db.json"):
-    """根据搜索条件从arXiv下载论文"""
-    # 创建本次下载的会话目录和说明文件
-    session_dir, readme_path = create_download_session_dir(download_dir, criteria)
+def download_paper_limited(url, filepath, per_host_limit=MAX_DOWNLOADS_PER_HOST) -> Optional[Exception]:
+    """在主机并发上限内下载论文PDF，返回值同download_paper"""
+    with get_host_semaphore(url, per_host_limit):
+        return download_paper(url, filepath)
+
+def search_stage(client, search, db, out_queue: queue.Queue, stop_event: threading.Event,
+                 stats: Dict, skipped_papers: List[str], found: List, max_searched: int = 1000):
+    """
+    搜索阶段：遍历arXiv搜索结果，把未下载过的论文放入队列
     
-    db = load_paper_database(db_path)
+    在后台线程运行，arXiv翻页等待期间后续阶段可以继续处理已取到的论文。
+    队列满时阻塞，收到stop_event后停止，结束时放入SEARCH_DONE；
+    搜索出错时放入异常，由主线程抛出（任务按未完成处理，检查点保留）。
+    从stats["total_searched"]处开始搜索（继续中断的任务时跳过已处理的结果）。
+    
+    队列中的每一项为 (已搜索数, 论文, 已跳过数)，用于在检查点中记录搜索进度。
+    """
+    def put(item) -> bool:
+        while not stop_event.is_set():
+            try:
+                out_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    try:
+        for paper in client.results(search, offset=stats["total_searched"]):
+            if stop_event.is_set():
+                break
+            try:
+                stats["total_searched"] += 1
+                print(f"\r已搜索 {stats['total_searched']} 篇论文，找到 {len(found)} 篇新论文...", end="")
+                
+                # 检查是否已下载（包括通过Semantic Scholar下载的同一篇论文）
+                if db.find(get_identity_keys(paper)):
+                    skipped_papers.append(f"已下载: {paper.title}")
+                    stats["already_downloaded"] += 1
+                    continue
+                
+                if not put((stats["total_searched"], paper, len(skipped_papers))):
+                    break
+            
+            except Exception as e:
+                print(f"\n处理论文信息时出错 {paper.title}: {str(e)}")
+                continue
+            
+            # 设置最大搜索上限
+            if stats["total_searched"] >= max_searched:
+                break
+    
+    except Exception as e:
+        put(e)
+    else:
+        put(SEARCH_DONE)
+
+def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_path="papers_db.json",
+                    max_workers=DOWNLOAD_WORKERS, per_host_limit=MAX_DOWNLOADS_PER_HOST,
+                    enrich_workers=ENRICH_WORKERS, queue_size=SEARCH_QUEUE_SIZE,
+                    checkpoint: Optional[job_checkpoint.Checkpoint] = None,
+                    db: Optional[paper_db.PaperStore] = None,
+                    claims: Optional[paper_identity.IdentityClaims] = None,
+                    cancel: Optional[threading.Event] = None):
+    """
+    根据搜索条件从arXiv下载论文
+    
+    搜索、引用信息查询和下载三个阶段以流水线方式并行：搜索线程预取arXiv结果，
+    引用查询按批并发进行；按相关度排序时，论文一经通过过滤就开始下载。
+    
+    任务进度（搜索位置、候选论文及其引用信息、已完成的下载）保存在会话目录的检查点中，
+    中断后可用resume_download继续。
+    
+    参数:
+        max_workers: 并发下载的线程数
+        per_host_limit: 同一主机的最大并发下载数
+        enrich_workers: 同时进行的引用查询批次数
+        queue_size: 搜索阶段预取的最大论文数
+        checkpoint: 要继续的任务的检查点，为None时开始新任务
+        db: 多个任务共用的数据库（由调用方关闭），为None时按db_path打开
+        claims: 多个任务共用的论文认领表，其他任务已认领的论文不再下载
+        cancel: 在线程中运行时用于中断任务的事件，设置后保存检查点并停止
+    返回:
+        bool: 任务是否完成（搜索或下载出错时为False，错误信息已打印）
+    """
+    if checkpoint is None:
+        # 创建本次下载的会话目录和说明文件
+        session_dir, readme_path = create_download_session_dir(download_dir, criteria)
+        checkpoint = job_checkpoint.Checkpoint.create(
+            session_dir, "arxiv", criteria, readme_path=readme_path, db_path=db_path,
+            search={"offset": 0, "skipped": [], "done": False},
+            stats={"citation_filter": 0, "keyword_filter": 0},
+            candidates=[], planned={}, recorded=[]
+        )
+    else:
+        session_dir, readme_path = checkpoint.state["session_dir"], checkpoint.state["readme_path"]
+        print(f"继续未完成的下载任务: {session_dir}")
+    state = checkpoint.state
+    completed = False
+    
+    own_db = db is None
+    if own_db:
+        db = load_paper_database(db_path)
+    manifest = file_manifest.FileManifest(file_manifest.manifest_path_for(db_path))
+    retries = retry_queue.RetryQueue(retry_queue.queue_path_for(db_path))
+    failed_downloads = []
+    download_executor = None
     
     try:
         query = build_arxiv_query(criteria)
-        client = arxiv.Client()
+        client = get_arxiv_client()
         
         # 增加搜索范围
         search_max_results = max(criteria.max_results * 50, 2000)  # 进一步增加搜索范围
@@ -428,33 +783,121 @@ def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_pa
         )
         
         print(f"正在搜索论文...")
-        papers_with_info = []
-        total_searched = 0
-        skipped_papers = []
+        # 从检查点恢复已处理的搜索结果（新任务时为空）
+        papers_with_info = [(paper_from_dict(item["paper"]), item["citation_info"]) for item in state["candidates"]]
+        skipped_papers = list(state["search"]["skipped"])
+        recorded = set(state["recorded"])
         
         filtered_count = {
-            "already_downloaded": 0,
-            "citation_filter": 0,
-            "keyword_filter": 0
+            "total_searched": state["search"]["offset"],
+            "already_downloaded": len(skipped_papers),
+            **state["stats"]
         }
         
-        # 使用迭代器方式获取结果
-        try:
-            results_iterator = client.results(search)
-            for paper in results_iterator:
+        # 相关度排序时无需等待全部结果，边搜索边下载
+        stream_downloads = criteria.sort_by == SortOrder.RELEVANCE
+        
+        search_queue = queue.Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        searcher = threading.Thread(
+            target=search_stage,
+            args=(client, search, db, search_queue, stop_event, filtered_count, skipped_papers, papers_with_info),
+            daemon=True
+        )
+        enrich_executor = ThreadPoolExecutor(max_workers=enrich_workers)
+        download_executor = ThreadPoolExecutor(max_workers=max_workers)
+        
+        # 下载阶段的状态：按排名排队的下载任务和已占用的文件名
+        planned_downloads = deque()
+        reserved_filenames = set()
+        progress = tqdm(total=0, desc="下载进度")
+        
+        def schedule_download(rank, paper, citation_info, filename=None):
+            """
+            分配文件名并提交下载任务（在主线程中分配，避免并发下载时文件名冲突）
+            
+            继续中断的任务时filename为检查点中记录的文件名，下载从.part临时文件续传
+            """
+            paper_id = paper.get_short_id()
+            
+            # 检查论文是否已经下载过，此时已知Semantic Scholar paperId，可以匹配更多来源
+            identity_keys = get_identity_keys(paper, citation_info)
+            existing_id = db.find(identity_keys)
+            if existing_id:
+                print(f"\n论文已存在数据库中({existing_id})，跳过: {paper.title}")
+                return
+            if claims is not None and not claims.claim(identity_keys):
+                print(f"\n论文已由其他任务下载，跳过: {paper.title}")
+                return
+            
+            if filename is None:
+                # 生成文件名
+                safe_filename = get_safe_filename(paper.authors, paper.title)
+                filename = f"{safe_filename}.pdf"
+                filepath = os.path.join(session_dir, filename)
+                
+                if os.path.exists(filepath) or filename in reserved_filenames:
+                    filename = f"{safe_filename}_{paper_id}.pdf"
+                    filepath = os.path.join(session_dir, filename)
+            else:
+                filepath = os.path.join(session_dir, filename)
+            
+            reserved_filenames.add(filename)
+            state["planned"][get_arxiv_base_id(paper_id)] = {"rank": rank, "filename": filename}
+            future = download_executor.submit(download_paper_limited, paper.pdf_url, filepath, per_host_limit)
+            planned_downloads.append((rank, paper, citation_info, filename, future))
+            progress.total += 1
+            progress.refresh()
+        
+        def record_downloads(wait: bool):
+            """按排名顺序处理已完成的下载，更新说明文件和数据库"""
+            while planned_downloads and (wait or planned_downloads[0][4].done()):
+                job_checkpoint.check_cancelled(cancel)
+                if not planned_downloads[0][4].done():
+                    # 等待下载时定期检查任务是否被取消
+                    wait_futures([planned_downloads[0][4]], timeout=BATCH_WAIT_SECONDS)
+                    continue
+                rank, paper, citation_info, filename, future = planned_downloads.popleft()
                 try:
-                    total_searched += 1
-                    print(f"\r已搜索 {total_searched} 篇论文，找到 {len(papers_with_info)} 篇新论文...", end="")
+                    base_id = get_arxiv_base_id(paper.get_short_id())
+                    filepath = os.path.join(session_dir, filename)
+                    sha256 = None
                     
-                    # 检查是否已下载
-                    paper_id = paper.get_short_id()
-                    if paper_id in db["papers"]:
-                        skipped_papers.append(f"已下载: {paper.title}")
-                        filtered_count["already_downloaded"] += 1
-                        continue
+                    # 下载PDF
+                    error = future.result()
+                    if error is None:
+                        print(f"\n成功下载论文: {paper.title}")
+                        
+                        # 更新说明文件
+                        update_download_info(readme_path, paper, citation_info, rank)
+                        # 放入内容存储，会话目录中只保留链接
+                        sha256 = pdf_store.try_ingest(filepath)
+                        manifest.record(base_id, filepath)
                     
-                    # 获取引用信息并检查
-                    citation_info = get_citation_count(paper.title, [str(author) for author in paper.authors])
+                    # 元数据以不带版本号的ID为键，新版本不会被当成新论文
+                    record = build_paper_record(paper, citation_info, filename, sha256=sha256)
+                    if error is not None:
+                        # 下载失败的论文只记入重试队列，重试成功后由retry_queue写入数据库
+                        retries.fail(base_id, paper.pdf_url, filepath, record, error, "arxiv")
+                        failed_downloads.append(paper.title)
+                    else:
+                        try:
+                            save_paper_database(db, base_id, record)
+                        except Exception as e:
+                            print(f"保存元数据失败: {str(e)}")
+                
+                except Exception as e:
+                    print(f"\n处理论文时出错 {paper.title}: {str(e)}")
+                finally:
+                    progress.update(1)
+                # 中断时正在处理的论文不算完成，继续任务时重新处理
+                state["recorded"].append(get_arxiv_base_id(paper.get_short_id()))
+                checkpoint.save()
+        
+        def filter_batch(batch, citation_infos) -> bool:
+            """过滤一批已查询引用信息的论文，找到足够的论文时返回True"""
+            for (_, paper, _), citation_info in zip(batch, citation_infos):
+                try:
                     if (criteria.min_citations is not None and citation_info["citation_count"] < criteria.min_citations) or \
                        (criteria.max_citations is not None and citation_info["citation_count"] > criteria.max_citations):
                         filtered_count["citation_filter"] += 1
@@ -466,90 +909,119 @@ def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_pa
                         continue
                     
                     papers_with_info.append((paper, citation_info))
+                    state["candidates"].append({"paper": paper_to_dict(paper), "citation_info": citation_info})
                     print(f"\n找到新论文: {paper.title}")
+                    if stream_downloads:
+                        schedule_download(len(papers_with_info), paper, citation_info)
                     
                     # 如果找到足够的论文就停止
                     if len(papers_with_info) >= criteria.max_results:
-                        break
+                        return True
                 
                 except Exception as e:
                     print(f"\n处理论文信息时出错 {paper.title}: {str(e)}")
                     continue
+            return False
+        
+        def save_search_progress(batch):
+            """记录已完成过滤的搜索位置，继续任务时从这里重新搜索"""
+            searched, _, skipped_count = batch[-1]
+            state["search"]["offset"] = searched
+            state["search"]["skipped"] = skipped_papers[:skipped_count]
+            state["stats"] = {key: filtered_count[key] for key in ("citation_filter", "keyword_filter")}
+            checkpoint.save()
+        
+        # 继续中断的任务：重新提交已计划但未完成的下载
+        for paper, citation_info in papers_with_info:
+            base_id = get_arxiv_base_id(paper.get_short_id())
+            plan = state["planned"].get(base_id)
+            if plan and base_id not in recorded:
+                schedule_download(plan["rank"], paper, citation_info, plan["filename"])
+        
+        # 引用查询阶段：从搜索队列攒批，并发查询，按提交顺序过滤以保持相关度顺序
+        enrich_batches = deque()
+        try:
+            if state["search"]["done"]:
+                search_queue.put(SEARCH_DONE)
+            else:
+                searcher.start()
+            
+            batch = []
+            search_done = False
+            enough = False
+            while not enough:
+                job_checkpoint.check_cancelled(cancel)
+                try:
+                    item = search_queue.get(timeout=BATCH_WAIT_SECONDS)
+                except queue.Empty:
+                    item = None
+                
+                if isinstance(item, Exception):
+                    raise item
+                if item is SEARCH_DONE:
+                    search_done = True
+                elif item is not None:
+                    batch.append(item)
+                
+                # 批次已满、搜索结束或等待超时时提交查询
+                if batch and (len(batch) >= CITATION_BATCH_SIZE or search_done or item is None):
+                    enrich_batches.append((batch, enrich_executor.submit(get_citation_counts,
+                                                                         [paper for _, paper, _ in batch])))
+                    batch = []
                 
-                # 设置最大搜索上限
-                if total_searched >= 1000:
+                while enrich_batches and (search_done or len(enrich_batches) >= enrich_workers
+                                          or enrich_batches[0][1].done()):
+                    done_batch, future = enrich_batches.popleft()
+                    enough = filter_batch(done_batch, future.result())
+                    save_search_progress(done_batch)
+                    if enough:
+                        break
+                
+                record_downloads(wait=False)
+                
+                if search_done and not enrich_batches and not batch:
                     break
-        
-        except Exception as e:
-            print(f"\n搜索过程中出错: {str(e)}")
-            print("请检查网络连接或稍后重试")
+            
+            state["search"]["done"] = True
+            checkpoint.save(force=True)
+        finally:
+            # 通知搜索线程停止并丢弃尚未处理的批次
+            stop_event.set()
+            for _, future in enrich_batches:
+                future.cancel()
+            enrich_executor.shutdown(wait=False)
         
         print("\n")  # 换行
         
         if not papers_with_info:
+            progress.close()
+            download_executor.shutdown(wait=True)
+            completed = True
             print("\n没有找到新的符合条件的论文")
-            return
+            return True
         
         print(f"\n共找到 {len(papers_with_info)} 篇新论文")
         
-        # 排序
-        print(f"\n正在按{criteria.sort_by.value}排序...")
-        papers_with_info = sort_papers(papers_with_info, criteria.sort_by)
+        if not stream_downloads and not state["planned"]:
+            # 排序
+            print(f"\n正在按{criteria.sort_by.value}排序...")
+            papers_with_info = sort_papers(papers_with_info, criteria.sort_by)
+            
+            # 限制下载数量
+            papers_to_download = papers_with_info[:criteria.max_results]
+            
+            # 下载论文
+            print(f"\n开始下载 {len(papers_to_download)} 篇论文...")
+            for rank, (paper, citation_info) in enumerate(papers_to_download, 1):
+                schedule_download(rank, paper, citation_info)
         
-        # 限制下载数量
-        papers_to_download = papers_with_info[:criteria.max_results]
+        # 等待剩余下载完成，按排名顺序处理结果，保证说明文件和数据库的顺序
+        record_downloads(wait=True)
+        progress.close()
+        download_executor.shutdown(wait=True)
         
-        # 下载论文
-        print(f"\n开始下载 {len(papers_to_download)} 篇论文...")
+        total_searched = filtered_count["total_searched"]
         
-        # 使用tqdm创建进度条
-        for paper, citation_info in tqdm(papers_to_download, desc="下载进度"):
-            try:
-                paper_id = paper.get_short_id()
-                
-                # 检查论文是否已经下载过
-                if paper_id in db["papers"]:
-                    print(f"\n论文已存在数据库中，跳过: {paper.title}")
-                    continue
-                
-                # 生成文件名
-                safe_filename = get_safe_filename(paper.authors, paper.title)
-                filename = f"{safe_filename}.pdf"
-                filepath = os.path.join(session_dir, filename)
-                
-                if os.path.exists(filepath):
-                    filename = f"{safe_filename}_{paper_id}.pdf"
-                    filepath = os.path.join(session_dir, filename)
-                
-                # 下载PDF
-                if download_paper(paper.pdf_url, filepath):
-                    print(f"\n成功下载论文: {paper.title}")
-                    
-                    # 更新说明文件
-                    update_download_info(readme_path, paper, citation_info, papers_to_download.index((paper, citation_info)) + 1)
-                    
-                # 保存元数据
-                try:
-                    db["papers"][paper_id] = {
-                        "title": paper.title,
-                        "authors": [str(author) for author in paper.authors],
-                        "abstract": paper.summary,
-                        "citation_count": citation_info["citation_count"],
-                        "semantic_scholar_url": citation_info["semantic_scholar_url"],
-                        "published_date": paper.published.strftime("%Y-%m-%d"),
-                        "downloaded_date": datetime.now().strftime("%Y-%m-%d"),
-                        "filename": filename,
-                        "arxiv_url": paper.pdf_url,
-                        "categories": paper.categories
-                    }
-                    save_paper_database(db_path, db)
-                except Exception as e:
-                    print(f"保存元数据失败: {str(e)}")
-            
-            except Exception as e:
-                print(f"\n处理论文时出错 {paper.title}: {str(e)}")
-                continue
-                    
         # 打印跳过的论文信息
         if skipped_papers:
             print("\n\n跳过的论文:")
@@ -563,6 +1035,9 @@ def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_pa
         print(f"因引用数过滤掉: {filtered_count['citation_filter']}")
         print(f"因关键词过滤掉: {filtered_count['keyword_filter']}")
         print(f"符合条件的新论文: {len(papers_with_info)}")
+        print(f"引用缓存: {citation_cache.get_default_cache().summary()}")
+        if failed_downloads:
+            print(f"下载失败: {len(failed_downloads)} 篇，已加入重试队列（python retry_queue.py drain）")
         
         if total_searched < search_max_results:
             print("\n注意: 搜索结果少于预期，可能原因:")
@@ -570,10 +1045,168 @@ def download_papers(criteria: SearchCriteria, download_dir="arxiv_papers", db_pa
             print("2. 关键词可能需要调整")
             print("3. 可以尝试添加更多的分类")
             print("4. 考虑放宽年份或引用数限制")
+        completed = True
         
     except Exception as e:
         print(f"\n搜索过程中出错: {str(e)}")
         print("请检查网络连接或稍后重试")
+    finally:
+        if completed:
+            checkpoint.remove()
+        else:
+            if download_executor is not None:
+                # 未开始的下载不再进行，继续任务时重新提交
+                download_executor.shutdown(wait=False, cancel_futures=True)
+            checkpoint.save(force=True)
+            print(f"\n任务进度已保存，可运行 python arxiv_downloader.py --resume \"{checkpoint.path}\" 继续")
+        retries.save()
+        manifest.save()
+        if own_db:
+            db.close()
+    return completed
+
+def resume_download(resume_path: Optional[str] = None, download_dir="arxiv_papers", **kwargs):
+    """
+    继续被中断的下载任务
+    
+    参数:
+        resume_path: 检查点文件或会话目录，为None时使用下载目录中最近一次未完成的任务
+        kwargs: 传给download_papers的并发参数
+    """
+    checkpoint = job_checkpoint.Checkpoint.load(job_checkpoint.resolve_resume_path(resume_path, download_dir), "arxiv")
+    download_papers(checkpoint.criteria(SearchCriteria), download_dir,
+                    checkpoint.state.get("db_path", "papers_db.json"), checkpoint=checkpoint, **kwargs)
+
+def find_version_updates(client, known: Dict[str, tuple], batch_size: int = ID_LIST_BATCH_SIZE) -> List[tuple]:
+    """
+    通过arXiv id_list批量查询已知论文的最新版本
+
+    参数:
+        client: arXiv客户端
+        known: {基础ID: (数据库键, 记录, 已下载版本)}
+        batch_size: 每次查询的ID数量
+    返回:
+        有新版本的论文列表 [(论文, 数据库键, 记录, 已下载版本)]
+    """
+    updates = []
+    base_ids = list(known)
+    for start in range(0, len(base_ids), batch_size):
+        chunk = base_ids[start:start + batch_size]
+        print(f"\r正在检查版本 {start + len(chunk)}/{len(base_ids)}...", end="")
+        try:
+            # 不带版本号的ID返回最新版本
+            search = arxiv.Search(id_list=chunk, max_results=len(chunk))
+            for paper in client.results(search):
+                base_id = get_arxiv_base_id(paper.get_short_id())
+                if base_id not in known:
+                    continue
+                paper_id, record, stored_version = known[base_id]
+                if get_arxiv_version(paper.get_short_id()) > stored_version:
+                    updates.append((paper, paper_id, record, stored_version))
+        except Exception as e:
+            print(f"\n查询版本信息时出错: {str(e)}")
+    print()
+    return updates
+
+def refresh_papers(download_dir="arxiv_papers", db_path="papers_db.json",
+                   max_workers=DOWNLOAD_WORKERS, per_host_limit=MAX_DOWNLOADS_PER_HOST,
+                   batch_size=ID_LIST_BATCH_SIZE):
+    """
+    检查数据库中的arXiv论文是否有新版本，只下载版本比已下载版本新的论文
+
+    新版本下载到单独的更新会话目录，记录改为以基础ID为键并追加版本历史，
+    旧版本的文件保留在原目录中。
+    """
+    db = load_paper_database(db_path)
+    manifest = file_manifest.FileManifest(file_manifest.manifest_path_for(db_path))
+    retries = retry_queue.RetryQueue(retry_queue.queue_path_for(db_path))
+    try:
+        # 收集数据库中的arXiv论文；同一篇论文有多个旧版本记录时以最新的为准
+        known = {}
+        for paper_id, record in db.items():
+            # Semantic Scholar的记录虽然有arxiv_id，但不知道下载的是哪个版本
+            if record.get("source") == "semantic_scholar":
+                continue
+            arxiv_id = record.get("arxiv_id") or paper_id
+            if not paper_identity.is_arxiv_id(arxiv_id):
+                continue
+            base_id = get_arxiv_base_id(arxiv_id)
+            version = get_stored_version(paper_id, record)
+            if base_id not in known or version > known[base_id][2]:
+                known[base_id] = (paper_id, record, version)
+        
+        if not known:
+            print("数据库中没有arXiv论文")
+            return
+        
+        print(f"正在检查 {len(known)} 篇arXiv论文的新版本...")
+        updates = find_version_updates(get_arxiv_client(), known, batch_size)
+        if not updates:
+            print("所有论文都已是最新版本")
+            return
+        
+        print(f"发现 {len(updates)} 篇论文有新版本")
+        
+        os.makedirs(download_dir, exist_ok=True)
+        session_dir = os.path.join(download_dir, f"version_updates_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(session_dir)
+        readme_path = os.path.join(session_dir, "download_info.md")
+        with open(readme_path, 'w', encoding='utf-8') as f:
+            f.write("# arXiv论文版本更新\n\n")
+            f.write(f"下载时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+            f.write("| 序号 | 标题 | arXiv ID | 原版本 | 新版本 |\n")
+            f.write("|------|------|----------|--------|--------|\n")
+        
+        planned = []
+        reserved_filenames = set()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for paper, paper_id, record, stored_version in updates:
+                filename = f"{get_safe_filename(paper.authors, paper.title)}_v{get_arxiv_version(paper.get_short_id())}.pdf"
+                if filename in reserved_filenames:
+                    filename = f"{get_safe_filename(paper.authors, paper.title)}_{paper.get_short_id()}.pdf"
+                reserved_filenames.add(filename)
+                future = executor.submit(download_paper_limited, paper.pdf_url,
+                                         os.path.join(session_dir, filename), per_host_limit)
+                planned.append((paper, paper_id, record, stored_version, filename, future))
+            
+            success_count = 0
+            for index, (paper, paper_id, record, stored_version, filename, future) in enumerate(tqdm(planned, desc="下载进度"), 1):
+                base_id = get_arxiv_base_id(paper.get_short_id())
+                citation_info = {
+                    "citation_count": record.get("citation_count", 0),
+                    "semantic_scholar_url": record.get("semantic_scholar_url")
+                }
+                filepath = os.path.join(session_dir, filename)
+                error = future.result()
+                if error is not None:
+                    print(f"\n下载新版本失败: {paper.title}")
+                    # 重试成功后再写入新版本记录，旧记录保持不变
+                    retries.fail(base_id, paper.pdf_url, filepath,
+                                 build_paper_record(paper, citation_info, filename, record, paper_id),
+                                 error, "arxiv_refresh", replaces=[paper_id])
+                    continue
+                
+                success_count += 1
+                sha256 = pdf_store.try_ingest(filepath)
+                save_paper_database(db, base_id,
+                                    build_paper_record(paper, citation_info, filename, record, paper_id, sha256))
+                manifest.record(base_id, filepath)
+                # 以带版本号的ID为键的旧记录已合并到新记录中
+                if paper_id != base_id:
+                    db.delete_many([paper_id])
+                
+                with open(readme_path, 'a', encoding='utf-8') as f:
+                    f.write(f"| {index} | {paper.title} | {base_id} | v{stored_version} | "
+                            f"v{get_arxiv_version(paper.get_short_id())} |\n")
+        
+        print(f"\n版本更新完成: 成功 {success_count} 篇，失败 {len(planned) - success_count} 篇")
+        print(f"新版本保存在: {session_dir}")
+        if success_count < len(planned):
+            print("下载失败的论文已加入重试队列（python retry_queue.py drain）")
+    finally:
+        retries.save()
+        manifest.save()
+        db.close()
 
 def get_preset_keywords() -> dict:
     """返回预设的关键词组合"""
@@ -808,6 +1441,22 @@ def interactive_search():
     print("\n=== arXiv论文下载工具 ===")
     print("(提示：直接按回车使用默认值或跳过，输入'null'表示不限制)")
     
+    print("\n请选择操作:")
+    print("1. 搜索并下载新论文")
+    print("2. 检查已下载论文的新版本")
+    print("3. 重试之前下载失败的论文")
+    print("4. 继续上次中断的下载任务")
+    action = get_user_input("请输入选项编号", "1")
+    if action == "2":
+        refresh_papers(download_dir=get_user_input("请输入下载目录名称", "arxiv_papers"))
+        return
+    if action == "3":
+        retry_queue.drain()
+        return
+    if action == "4":
+        resume_download(download_dir=get_user_input("请输入下载目录名称", "arxiv_papers"))
+        return
+    
     # 获取基本搜索条件
     keywords = get_keywords_input()
     title = get_user_input("请输入论文标题关键词（可选）")
@@ -946,8 +1595,15 @@ def interactive_search():
         print("已取消下载")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="arXiv论文下载工具")
+    parser.add_argument("--resume", nargs="?", const="", default=None, metavar="CHECKPOINT",
+                        help="继续中断的下载任务，可指定检查点文件或会话目录（默认为最近一次）")
+    args = parser.parse_args()
     try:
-        interactive_search()
+        if args.resume is not None:
+            resume_download(args.resume or None)
+        else:
+            interactive_search()
     except KeyboardInterrupt:
         print("\n\n程序已被用户中断")
     except Exception as e:
@@ -0,0 +1,257 @@
+"""
+批量下载任务
+
+不经过交互式输入，按任务文件（JSON、YAML或TOML）中的搜索条件批量下载论文，可以用定时任务运行：
+
+    python batch_runner.py run jobs.yaml
+    python batch_runner.py presets jobs.yaml     # 生成每个预设关键词一个任务的任务文件
+
+任务文件格式（YAML示例）:
+
+    defaults:              # 所有任务共用的条件，任务中的同名字段优先
+      source: both         # arxiv、semantic_scholar或both
+      max_results: 20
+      year_from: 2020
+    jobs:
+      - name: 大语言模型
+        keywords: Large Language Model, LLM
+        sort_by: citations
+      - preset: 计算机视觉   # 使用下载器get_preset_keywords()中的预设关键词（名称，只有一个来源时也可用编号）
+        source: arxiv
+        categories: [cs.CV]
+
+字段与两个下载器的SearchCriteria相同，只属于其中一个来源的字段（如categories、venues）
+在另一个来源中忽略。所有任务在同一进程中运行，共用HTTP连接池、限速器、引用缓存、
+arXiv客户端和数据库，多个任务并发执行；几个任务搜到同一篇论文时只下载一次。
+按Ctrl-C中断时尚未开始的任务被取消，正在运行的任务保存各自的检查点后停止，
+可用对应下载器的 --resume 继续。
+"""
+import argparse
+import dataclasses
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+try:
+    import yaml
+except ImportError:  # 只使用JSON或TOML任务文件时不需要PyYAML
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:  # Python 3.11之前没有tomllib
+    tomllib = None
+
+import arxiv_downloader
+import citation_cache
+import job_checkpoint
+import open_papers_downloader
+import paper_db
+import paper_identity
+
+JOB_WORKERS = 2             # 同时运行的任务数
+SOURCES = {
+    "arxiv": arxiv_downloader,
+    "semantic_scholar": open_papers_downloader,
+}
+DOWNLOAD_DIRS = {
+    "arxiv": "arxiv_papers",
+    "semantic_scholar": "semantic_scholar_papers",
+}
+JOB_KEYS = {"name", "source", "preset", "download_dir"}  # 任务文件中不属于搜索条件的字段
+
+@dataclasses.dataclass
+class BatchJob:
+    """展开后的单个任务：一个来源上的一组搜索条件"""
+    name: str
+    source: str
+    criteria: object
+    download_dir: str
+
+def load_job_file(path: str) -> Dict:
+    """按扩展名读取JSON、YAML或TOML任务文件"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError("读取YAML任务文件需要安装PyYAML: pip install pyyaml")
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+    elif ext == ".toml":
+        if tomllib is None:
+            raise ValueError("读取TOML任务文件需要Python 3.11以上版本")
+        with open(path, 'rb') as f:
+            config = tomllib.load(f)
+    elif ext == ".json":
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    else:
+        raise ValueError(f"不支持的任务文件格式: {path}（支持.json、.yaml、.yml、.toml）")
+    if isinstance(config, list):
+        config = {"jobs": config}
+    if not isinstance(config, dict) or not isinstance(config.get("jobs"), list):
+        raise ValueError("任务文件中缺少jobs列表")
+    return config
+
+def _resolve_preset(module, preset) -> Dict:
+    """按编号或名称查找下载器的预设关键词"""
+    presets = module.get_preset_keywords()
+    preset = str(preset)
+    if preset in presets:
+        return presets[preset]
+    for item in presets.values():
+        if item["name"] == preset:
+            return item
+    raise ValueError(f"{module.__name__}中没有预设关键词: {preset}")
+
+def _criteria_fields(module) -> set:
+    return {field.name for field in dataclasses.fields(module.SearchCriteria)}
+
+def expand_jobs(config: Dict) -> List[BatchJob]:
+    """
+    把任务文件展开为各来源上的任务
+
+    source为both的任务展开为arXiv和Semantic Scholar两个任务。
+    字段不属于任何来源、排序方式在目标来源中不存在等错误在开始下载前报出。
+    """
+    defaults = config.get("defaults") or {}
+    known_keys = JOB_KEYS.union(*(_criteria_fields(module) for module in SOURCES.values()))
+    jobs = []
+    for index, entry in enumerate(config["jobs"], 1):
+        entry = {**defaults, **(entry or {})}
+        unknown = set(entry) - known_keys
+        if unknown:
+            raise ValueError(f"第{index}个任务包含未知字段: {', '.join(sorted(unknown))}")
+
+        source = entry.get("source", "both")
+        sources = list(SOURCES) if source == "both" else [source]
+        preset = entry.get("preset")
+        if preset is not None and len(sources) > 1 and str(preset) not in \
+                {item["name"] for item in SOURCES[sources[0]].get_preset_keywords().values()}:
+            # 两个下载器的预设编号不一致，同时使用两个来源时只能按名称指定
+            raise ValueError(f"第{index}个任务的来源为both，请用名称而不是编号指定预设关键词: {preset}")
+        for name in sources:
+            if name not in SOURCES:
+                raise ValueError(f"第{index}个任务的来源无效: {name}（可选 arxiv、semantic_scholar、both）")
+            module = SOURCES[name]
+            fields = {key: value for key, value in entry.items() if key in _criteria_fields(module)}
+            job_name = entry.get("name")
+            if preset is not None:
+                preset_item = _resolve_preset(module, preset)
+                fields.setdefault("keywords", preset_item["keywords"])
+                job_name = job_name or preset_item["name"]
+            try:
+                criteria = job_checkpoint.criteria_from_dict(module.SearchCriteria, fields)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"第{index}个任务在{name}上的搜索条件无效: {e}")
+            jobs.append(BatchJob(
+                name=str(job_name or criteria.keywords or f"job{index}"),
+                source=name,
+                criteria=criteria,
+                download_dir=entry.get("download_dir") or DOWNLOAD_DIRS[name]
+            ))
+    return jobs
+
+def run_job(job: BatchJob, db: paper_db.PaperStore, db_path: str, claims: paper_identity.IdentityClaims,
+            cancel: threading.Event):
+    """运行一个任务，cancel被设置时任务保存检查点后停止"""
+    if job.source == "arxiv":
+        # arXiv下载器自行打印错误，只返回是否完成
+        if not arxiv_downloader.download_papers(job.criteria, job.download_dir, db_path, db=db, claims=claims,
+                                                cancel=cancel):
+            raise RuntimeError("搜索或下载未完成，进度已保存在检查点中")
+    else:
+        open_papers_downloader.download_papers(job.criteria, job.download_dir, db_path, confirm=False,
+                                               db=db, claims=claims, cancel=cancel)
+
+def run_jobs(jobs: List[BatchJob], db_path: str = "papers_db.json", workers: int = JOB_WORKERS) -> Dict[str, int]:
+    """
+    在同一进程中并发运行多个任务
+
+    按Ctrl-C时取消尚未开始的任务，通知正在运行的任务保存检查点并停止，
+    等它们退出后再抛出KeyboardInterrupt。
+
+    参数:
+        jobs: expand_jobs展开的任务
+        db_path: 数据库路径
+        workers: 同时运行的任务数
+    返回:
+        {"finished": 完成数, "failed": 出错数}
+    """
+    db = paper_db.open_paper_store(db_path)
+    claims = paper_identity.IdentityClaims()
+    cancel = threading.Event()
+    summary = {"finished": 0, "failed": 0}
+    start = time.time()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(run_job, job, db, db_path, claims, cancel): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                future.result()
+                summary["finished"] += 1
+                print(f"\n[批量任务] 完成: {job.name} ({job.source})")
+            except Exception as e:
+                summary["failed"] += 1
+                print(f"\n[批量任务] 出错: {job.name} ({job.source}): {str(e)}")
+    except KeyboardInterrupt:
+        print("\n[批量任务] 正在停止，等待运行中的任务保存进度...")
+        cancel.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        db.close()
+
+    print(f"\n批量任务结束: 完成 {summary['finished']} 个，出错 {summary['failed']} 个，"
+          f"用时 {time.time() - start:.0f} 秒")
+    print(f"引用缓存: {citation_cache.get_default_cache().summary()}")
+    return summary
+
+def write_preset_jobs(path: str, source: str = "both", max_results: int = 20):
+    """生成每个预设关键词一个任务的任务文件（JSON或YAML）"""
+    module = arxiv_downloader if source in ("arxiv", "both") else open_papers_downloader
+    config = {
+        "defaults": {"source": source, "max_results": max_results},
+        "jobs": [{"name": item["name"], "keywords": item["keywords"]}
+                 for item in module.get_preset_keywords().values()]
+    }
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, 'w', encoding='utf-8') as f:
+        if ext in (".yaml", ".yml"):
+            if yaml is None:
+                raise ValueError("写入YAML任务文件需要安装PyYAML: pip install pyyaml")
+            yaml.safe_dump(config, f, allow_unicode=True, sort_keys=False)
+        elif ext == ".json":
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        else:
+            raise ValueError("任务文件只能生成为.json、.yaml或.yml格式")
+    print(f"已生成 {len(config['jobs'])} 个任务: {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按任务文件批量下载论文")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="运行任务文件中的全部任务")
+    run_parser.add_argument("job_file", help="任务文件（.json、.yaml、.yml或.toml）")
+    run_parser.add_argument("--db", default="papers_db.json", help="数据库路径")
+    run_parser.add_argument("--workers", type=int, default=JOB_WORKERS, help="同时运行的任务数")
+    presets_parser = subparsers.add_parser("presets", help="生成每个预设关键词一个任务的任务文件")
+    presets_parser.add_argument("job_file", help="要生成的任务文件（.json、.yaml或.yml）")
+    presets_parser.add_argument("--source", default="both", choices=["arxiv", "semantic_scholar", "both"])
+    presets_parser.add_argument("--max-results", type=int, default=20, help="每个任务的最大下载数量")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "run":
+            jobs = expand_jobs(load_job_file(args.job_file))
+            print(f"共 {len(jobs)} 个任务，同时运行 {args.workers} 个")
+            run_jobs(jobs, args.db, args.workers)
+        elif args.command == "presets":
+            write_preset_jobs(args.job_file, args.source, args.max_results)
+    except KeyboardInterrupt:
+        print("\n\n程序已被用户中断")
+    except ValueError as e:
+        print(f"\n任务文件错误: {str(e)}")
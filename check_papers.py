@@ -1,139 +1,309 @@
+import argparse
 import json
 import os
+import re
 import requests
+import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from tqdm import tqdm
 import arxiv
 
-def validate_pdf(filepath: str) -> bool:
-    """验证文件是否为有效的PDF"""
-    try:
-        with open(filepath, 'rb') as f:
-            header = f.read(4)
-            return header.startswith(b'%PDF')
-    except Exception:
-        return False
-
-def download_paper(url: str, filepath: str, max_retries=3) -> bool:
-    """下载论文PDF，支持重试"""
+import citation_cache
+import file_manifest
+import http_client
+import paper_db
+import paper_identity
+import pdf_fetcher
+import pdf_store
+import pdf_verify
+import rate_limiter
+
+ID_LIST_BATCH_SIZE = 100  # 每次arXiv id_list查询的论文数
+
+# 并发修复配置
+REPAIR_WORKERS = 4        # 同时修复的论文数
+HEDGE_DELAY = 5           # 当前来源多久没有结果时启动下一个来源（秒）
+SOURCE_STATS_PATH = "repair_sources.json"  # 各来源成功率统计
+SOURCE_NAMES = {"original": "原始链接", "semantic_scholar": "Semantic Scholar", "arxiv": "arXiv"}
+
+_arxiv_client = None
+_arxiv_lock = threading.Lock()
+
+def get_arxiv_client() -> arxiv.Client:
+    """所有arXiv查询共用的客户端，请求间隔由客户端统一控制"""
+    global _arxiv_client
+    if _arxiv_client is None:
+        _arxiv_client = arxiv.Client(
+            page_size=ID_LIST_BATCH_SIZE,
+            delay_seconds=3,  # 添加延迟避免触发限制
+            num_retries=5     # 增加重试次数
+        )
+    return _arxiv_client
+
+def download_paper(url: str, filepath: str, max_retries=3, cancel_event: threading.Event = None) -> bool:
+    """下载论文PDF，支持重试；cancel_event被设置时尽快放弃"""
     for attempt in range(max_retries):
+        if cancel_event is not None and cancel_event.is_set():
+            return False
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
+            # User-Agent等默认请求头由共享连接池提供；以.pdf结尾的链接不强制Content-Type
+            pdf_fetcher.stream_pdf(url, filepath, require_content_type=not url.lower().endswith('.pdf'),
+                                   cancel_event=cancel_event)
+            return True
             
-            # 验证是否为PDF文件
-            content_type = response.headers.get('content-type', '').lower()
-            if 'application/pdf' in content_type or url.lower().endswith('.pdf'):
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                if validate_pdf(filepath):
-                    return True
-                else:
-                    os.remove(filepath)
-                    print(f"下载的文件不是有效的PDF格式")
-            else:
-                print(f"下载的文件不是PDF格式 (Content-Type: {content_type})")
+        except pdf_fetcher.DownloadCancelled:
+            return False
+            
+        except pdf_fetcher.NotPdfError as e:
+            print(str(e))
                 
         except requests.exceptions.RequestException as e:
             if attempt < max_retries - 1:
                 print(f"下载失败，正在重试 ({attempt + 1}/{max_retries})")
-                time.sleep(2 ** attempt)  # 指数退避
+                # 带抖动的指数退避，等待期间可被取消
+                (cancel_event or threading.Event()).wait(rate_limiter.backoff_delay(attempt))
             else:
                 print(f"下载PDF失败: {str(e)}")
     return False
 
 def search_semantic_scholar(title: str) -> str:
-    """从Semantic Scholar搜索论文并返回PDF链接"""
+    """从Semantic Scholar搜索论文并返回PDF链接（缓存中有paperId时直接按ID查询）"""
     try:
-        base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
         headers = {"Accept": "application/json"}
+        cache = citation_cache.get_default_cache()
+        cached = cache.get(citation_cache.title_key(title))
+        paper_id = citation_cache.s2_id_from_url(cached["semantic_scholar_url"]) if cached else None
+        
+        if paper_id:
+            base_url = f"https://api.semanticscholar.org/graph/v1/paper/{paper_id}"
+            response = http_client.get(base_url, headers=headers, params={"fields": "title,openAccessPdf"})
+            response.raise_for_status()
+            paper = response.json()
+            if paper.get("openAccessPdf"):
+                return paper["openAccessPdf"].get("url")
+            return None
+        
+        base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
         params = {
             "query": title,
-            "fields": "title,openAccessPdf",
+            "fields": "title,openAccessPdf,citationCount,year",
             "limit": 1
         }
         
-        response = requests.get(base_url, headers=headers, params=params)
+        response = http_client.get(base_url, headers=headers, params=params)
         response.raise_for_status()
         data = response.json()
         
         if data.get("data") and len(data["data"]) > 0:
             paper = data["data"][0]
+            # 标题确认匹配时记入缓存
+            if paper.get("paperId") and title.lower() in (paper.get("title") or "").lower():
+                cache.put(
+                    [citation_cache.title_key(title), citation_cache.s2_key(paper["paperId"])],
+                    paper.get("citationCount") or 0,
+                    f"https://www.semanticscholar.org/paper/{paper['paperId']}",
+                    paper.get("year")
+                )
             if paper.get("openAccessPdf"):
                 return paper["openAccessPdf"].get("url")
     except Exception as e:
         print(f"从Semantic Scholar搜索时出错: {str(e)}")
     return None
 
+def get_arxiv_urls(paper) -> list:
+    """arXiv论文的PDF链接及备用链接"""
+    paper_id = paper.get_short_id()
+    return [
+        paper.pdf_url,
+        f"https://arxiv.org/pdf/{paper_id}",
+        f"https://arxiv.org/pdf/{paper_id}.pdf"
+    ]
+
 def search_arxiv(title: str) -> str:
-    """从arXiv搜索论文并返回PDF链接"""
+    """从arXiv按标题搜索论文并返回PDF链接"""
     try:
         # 清理标题，移除特殊字符
         clean_title = ' '.join(c for c in title if c.isalnum() or c.isspace())
         
-        client = arxiv.Client(
-            page_size=1,
-            delay_seconds=3,  # 添加延迟避免触发限制
-            num_retries=5     # 增加重试次数
-        )
         search = arxiv.Search(
             query=f'ti:"{clean_title}"',
             max_results=1
         )
         
-        results = list(client.results(search))
+        with _arxiv_lock:
+            results = list(get_arxiv_client().results(search))
         if results:
-            paper = results[0]
-            # 构建备用URL
-            paper_id = paper.get_short_id()
-            urls = [
-                paper.pdf_url,
-                f"https://arxiv.org/pdf/{paper_id}",
-                f"https://arxiv.org/pdf/{paper_id}.pdf"
-            ]
-            return urls
+            return get_arxiv_urls(results[0])
     except Exception as e:
         print(f"从arXiv搜索时出错: {str(e)}")
     return []
 
-def try_alternative_download(paper_info: dict, filepath: str) -> bool:
-    """尝试从多个来源下载论文"""
-    title = paper_info["title"]
-    print(f"\n尝试从其他来源下载: {title}")
-    
-    # 首先尝试从Semantic Scholar下载
-    pdf_url = search_semantic_scholar(title)
-    if pdf_url and download_paper(pdf_url, filepath):
-        print(f"从Semantic Scholar成功下载")
-        return True
-    
-    # 然后尝试从arXiv下载，尝试多个可能的URL
-    urls = search_arxiv(title)
-    for url in urls:
-        if url and download_paper(url, filepath):
-            print(f"从arXiv成功下载")
-            return True
+def extract_arxiv_id(paper_id: str, paper_info: dict):
+    """从数据库记录中取出不带版本号的arXiv ID，记录不是arXiv论文时返回None"""
+    candidates = [paper_info.get("arxiv_id"), paper_id]
+    # arxiv_url形如 http://arxiv.org/pdf/2301.01234v1
+    url = paper_info.get("arxiv_url") or ""
+    match = re.search(r'arxiv\.org/(?:abs|pdf)/(.+?)(?:\.pdf)?$', url)
+    if match:
+        candidates.append(match.group(1))
+    for candidate in candidates:
+        if candidate and paper_identity.is_arxiv_id(candidate):
+            return re.sub(r'v\d+$', '', candidate)
+    return None
+
+def lookup_arxiv_ids(arxiv_ids: list, batch_size: int = ID_LIST_BATCH_SIZE) -> dict:
+    """
+    通过id_list批量查询arXiv论文的PDF链接
     
-    print("所有来源都下载失败")
-    return False
+    返回:
+        {不带版本号的arXiv ID: PDF链接列表}，查不到的ID不在结果中
+    """
+    urls = {}
+    arxiv_ids = list(dict.fromkeys(arxiv_ids))
+    for start in range(0, len(arxiv_ids), batch_size):
+        chunk = arxiv_ids[start:start + batch_size]
+        try:
+            search = arxiv.Search(id_list=chunk, max_results=len(chunk))
+            with _arxiv_lock:
+                results = list(get_arxiv_client().results(search))
+            for paper in results:
+                urls[re.sub(r'v\d+$', '', paper.get_short_id())] = get_arxiv_urls(paper)
+        except Exception as e:
+            print(f"批量查询arXiv时出错: {str(e)}")
+    return urls
+
+class SourceStats:
+    """各下载来源的历史成功率，持久化在JSON文件中，决定竞速时来源的启动顺序"""
+    
+    def __init__(self, path: str = SOURCE_STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+    
+    def success_rate(self, source: str) -> float:
+        """平滑后的成功率，没有记录的来源为0.5"""
+        entry = self.data.get(source, {})
+        return (entry.get("successes", 0) + 1) / (entry.get("attempts", 0) + 2)
+    
+    def order(self, sources: list) -> list:
+        """按成功率从高到低排列来源，成功率相同时保持原顺序"""
+        return sorted(sources, key=lambda source: -self.success_rate(source[0]))
+    
+    def record(self, source: str, success: bool):
+        with self._lock:
+            entry = self.data.setdefault(source, {"attempts": 0, "successes": 0})
+            entry["attempts"] += 1
+            entry["successes"] += int(success)
+    
+    def summary(self) -> str:
+        return "，".join(
+            f"{SOURCE_NAMES.get(source, source)} {entry['successes']}/{entry['attempts']}"
+            for source, entry in sorted(self.data.items(), key=lambda item: -self.success_rate(item[0]))
+        )
+    
+    def save(self):
+        with self._lock:
+            paper_db.write_json_atomic(self.path, self.data)
 
-def clean_database(db_path: str, missing_papers: list):
+def race_sources(filepath: str, sources: list, stats: SourceStats, hedge_delay: float = HEDGE_DELAY):
+    """
+    多个来源对冲下载同一篇论文
+    
+    按历史成功率依次启动来源：当前来源失败或在hedge_delay秒内没有结果时启动下一个，
+    第一个下载到有效PDF的来源胜出，其余来源被取消。每个来源写入自己的临时文件，
+    胜出者的文件最后重命名到filepath。
+    
+    参数:
+        sources: [(来源名, 返回候选链接列表的函数)]
+    返回:
+        胜出的来源名，全部失败时返回None
+    """
+    cancel_event = threading.Event()
+    claimed_urls = set()
+    lock = threading.Lock()
+    winner = []
+    race_paths = {source: f"{filepath}.{source}.race" for source, _ in sources}
+    
+    def attempt(source, resolve):
+        """依次尝试来源的候选链接；返回是否成功，被取消时返回None"""
+        try:
+            urls = resolve() or []
+        except Exception as e:
+            print(f"\n获取{SOURCE_NAMES.get(source, source)}链接时出错: {str(e)}")
+            urls = []
+        for url in urls:
+            if cancel_event.is_set():
+                break
+            # 不同来源可能给出同一个链接，只下载一次
+            with lock:
+                if not url or url in claimed_urls:
+                    continue
+                claimed_urls.add(url)
+            if download_paper(url, race_paths[source], cancel_event=cancel_event):
+                with lock:
+                    if not winner:
+                        winner.append(source)
+                        cancel_event.set()
+                        return True
+                # 其他来源已经胜出，丢弃自己的文件
+                os.remove(race_paths[source])
+                return None
+        return None if cancel_event.is_set() else False
+    
+    pending_sources = stats.order(sources)
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    try:
+        running = {}
+        while not winner and (pending_sources or running):
+            if pending_sources:
+                source, resolve = pending_sources.pop(0)
+                running[executor.submit(attempt, source, resolve)] = source
+            done, _ = wait(running, timeout=hedge_delay if pending_sources else None,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    stats.record(running.pop(future), result)
+                else:
+                    running.pop(future)
+    finally:
+        # 不等待被取消的来源，它们会在下一个数据块处退出并清理自己的临时文件
+        cancel_event.set()
+        executor.shutdown(wait=False)
+    
+    if not winner:
+        return None
+    os.replace(race_paths[winner[0]], filepath)
+    return winner[0]
+
+def repair_paper(paper_info: dict, filepath: str, stats: SourceStats, arxiv_urls: list = None):
+    """
+    从原始链接、Semantic Scholar和arXiv竞速重新下载一篇论文
+    
+    参数:
+        arxiv_urls: 已通过id_list批量查到的arXiv链接；为None时按标题搜索arXiv
+    返回:
+        成功的来源名，全部失败时返回None
+    """
+    title = paper_info["title"]
+    sources = []
+    original_url = paper_info.get("arxiv_url") or paper_info.get("pdf_url")
+    if original_url:
+        sources.append(("original", lambda: [original_url]))
+    sources.append(("semantic_scholar", lambda: [search_semantic_scholar(title)]))
+    sources.append(("arxiv", lambda: arxiv_urls if arxiv_urls is not None else search_arxiv(title)))
+    return race_sources(filepath, sources, stats)
+
+def clean_database(db: paper_db.PaperStore, missing_papers: list):
     """从数据库中移除无法下载的论文记录"""
     try:
-        with open(db_path, 'r', encoding='utf-8') as f:
-            db = json.load(f)
-        
-        removed_papers = []
-        for paper_id, paper_info in missing_papers:
-            if paper_id in db["papers"]:
-                removed_papers.append(paper_info["title"])
-                del db["papers"][paper_id]
-        
-        with open(db_path, 'w', encoding='utf-8') as f:
-            json.dump(db, f, ensure_ascii=False, indent=2)
+        removed_papers = [paper_info["title"] for paper_id, paper_info in missing_papers if paper_id in db]
+        db.delete_many(paper_id for paper_id, _ in missing_papers)
         
         print("\n已从数据库中移除以下无法下载的论文:")
         for title in removed_papers:
@@ -142,96 +312,157 @@ def clean_database(db_path: str, missing_papers: list):
     except Exception as e:
         print(f"清理数据库时出错: {str(e)}")
 
-def check_and_fix_papers():
-    """检查论文数据库和实际下载文件的统计，并尝试重新下载缺失的PDF"""
+def check_and_fix_papers(verify: bool = False, deep: bool = False, workers: int = None):
+    """
+    检查论文数据库和实际下载文件的统计，并尝试重新下载缺失的PDF
+    
+    参数:
+        verify: 是否检查PDF文件结构，损坏的文件会和缺失的文件一起重新下载
+        deep: 是否深度检查（逐个核对交叉引用表中的对象）
+        workers: 检查文件结构的进程数，默认为CPU核数
+    """
     try:
         # 加载数据库
         db_path = "papers_db.json"
-        if not os.path.exists(db_path):
+        if not paper_db.database_exists(db_path):
             print("未找到papers_db.json文件")
             return
             
-        with open(db_path, 'r', encoding='utf-8') as f:
-            db = json.load(f)
-        
-        # 统计数据库中的论文数量
-        db_count = len(db["papers"])
-        print(f"\n数据库中记录的论文数量: {db_count}")
-        
-        # 获取所有PDF文件的路径
-        pdf_files = {}
+        db = paper_db.open_paper_store(db_path)
+        try:
+            # 统计数据库中的论文数量
+            db_count = len(db)
+            print(f"\n数据库中记录的论文数量: {db_count}")
         
-        # 检查arxiv文件夹
-        arxiv_dir = "arxiv_papers"
-        if os.path.exists(arxiv_dir):
-            for root, _, files in os.walk(arxiv_dir):
-                for file in files:
-                    if file.endswith('.pdf'):
-                        pdf_files[file] = os.path.join(root, file)
+            # 增量扫描arxiv和semantic scholar文件夹，只重新列出有变化的目录
+            arxiv_dir = "arxiv_papers"
+            semantic_dir = "Semantic_scholar_papers"
+            manifest = file_manifest.FileManifest(file_manifest.manifest_path_for(db_path))
+            pdf_count = manifest.scan([arxiv_dir, semantic_dir])
         
-        # 检查semantic scholar文件夹
-        semantic_dir = "Semantic_scholar_papers"
-        if os.path.exists(semantic_dir):
-            for root, _, files in os.walk(semantic_dir):
-                for file in files:
-                    if file.endswith('.pdf'):
-                        pdf_files[file] = os.path.join(root, file)
+            print(f"实际下载的PDF文件数量: {pdf_count}")
+            print(f"（检查了 {manifest.stats['dirs_checked']} 个目录，其中 {manifest.stats['dirs_rescanned']} 个有变化）")
         
-        print(f"实际下载的PDF文件数量: {len(pdf_files)}")
+            # 找出缺失的PDF文件
+            missing_papers = []
+            located = {}
+            for paper_id, paper_info in db.items():
+                filename = paper_info.get("filename")
+                if not filename:
+                    continue
+                relpath = manifest.locate(paper_id, filename)
+                if relpath is None:
+                    missing_papers.append((paper_id, paper_info))
+                else:
+                    located[paper_id] = (relpath, paper_info)
         
-        # 找出缺失的PDF文件
-        missing_papers = []
-        for paper_id, paper_info in db["papers"].items():
-            filename = paper_info.get("filename")
-            if filename and filename not in pdf_files:
-                missing_papers.append((paper_id, paper_info))
+            # 检查已有文件的结构，损坏的文件在原位置重新下载
+            damaged = {}
+            if verify:
+                print(f"\n正在检查 {len(located)} 个PDF文件的完整性...")
+                results = pdf_verify.verify_files(manifest, [relpath for relpath, _ in located.values()],
+                                                  deep=deep, workers=workers)
+                for paper_id, (relpath, paper_info) in located.items():
+                    ok, reason = results[relpath]
+                    if not ok:
+                        damaged[paper_id] = relpath
+                        missing_papers.append((paper_id, paper_info))
+                        print(f"- 文件损坏（{reason}）: {relpath}")
+                print(f"发现 {len(damaged)} 个损坏的PDF文件")
+            manifest.save()
         
-        if missing_papers:
-            print(f"\n发现 {len(missing_papers)} 篇论文的PDF文件缺失:")
-            for paper_id, paper_info in missing_papers:
-                print(f"- {paper_info['title']}")
+            if missing_papers:
+                print(f"\n发现 {len(missing_papers)} 篇论文的PDF文件缺失或损坏:")
+                for paper_id, paper_info in missing_papers:
+                    print(f"- {paper_info['title']}")
             
-            try:
-                print("\n开始自动尝试重新下载缺失的论文...")
+                try:
+                    print("\n开始自动尝试重新下载缺失的论文...")
+                
+                    # 创建新的下载会话目录（损坏的文件在原位置重新下载，不需要新目录）
+                    timestamp = time.strftime("%Y%m%d_%H%M%S")
+                    session_dir = os.path.join(arxiv_dir, f"download_session_{timestamp}")
+                    if len(damaged) < len(missing_papers):
+                        os.makedirs(session_dir, exist_ok=True)
+                
+                    success_count = 0
+                    failed_papers = []
+                
+                    # 内容存储中有哈希一致的副本时直接恢复（损坏的文件可能就是存储中的对象，需重新下载）
+                    to_download = []
+                    used_filenames = set()
+                    for paper_id, paper_info in missing_papers:
+                        if paper_id in damaged:
+                            filepath = manifest.abspath(damaged[paper_id])
+                        else:
+                            # 并发下载时不同论文不能写同一个文件
+                            filename = paper_info["filename"]
+                            if filename in used_filenames:
+                                filename = f"{paper_id.replace('/', '_')}_{filename}"
+                            used_filenames.add(filename)
+                            filepath = os.path.join(session_dir, filename)
+                        if paper_id not in damaged and paper_info.get("sha256") and \
+                                pdf_store.restore(paper_info["sha256"], filepath):
+                            print(f"\n从PDF存储恢复: {paper_info['title']}")
+                            manifest.record(paper_id, filepath)
+                            success_count += 1
+                        else:
+                            to_download.append((paper_id, paper_info, filepath))
                 
-                # 创建新的下载会话目录
-                timestamp = time.strftime("%Y%m%d_%H%M%S")
-                session_dir = os.path.join(arxiv_dir, f"download_session_{timestamp}")
-                os.makedirs(session_dir, exist_ok=True)
+                    # 有arXiv ID的论文一起批量查询，只有没有ID的论文才按标题逐篇搜索
+                    arxiv_ids = {paper_id: extract_arxiv_id(paper_id, paper_info) for paper_id, paper_info, _ in to_download}
+                    known_ids = [arxiv_id for arxiv_id in arxiv_ids.values() if arxiv_id]
+                    arxiv_urls = lookup_arxiv_ids(known_ids) if known_ids else {}
                 
-                success_count = 0
-                failed_papers = []
-                for paper_id, paper_info in tqdm(missing_papers, desc="下载进度"):
-                    filepath = os.path.join(session_dir, paper_info["filename"])
-                    
-                    # 首先尝试原始URL
-                    original_url = paper_info.get("arxiv_url") or paper_info.get("pdf_url")
-                    if original_url and download_paper(original_url, filepath):
-                        print(f"\n使用原始链接成功下载: {paper_info['title']}")
-                        success_count += 1
-                        continue
-                    
-                    # 如果原始URL失败，尝试其他来源
-                    if try_alternative_download(paper_info, filepath):
-                        success_count += 1
-                    else:
-                        failed_papers.append((paper_id, paper_info))
+                    # 多篇论文并发修复，每篇论文内部多个来源竞速
+                    source_stats = SourceStats()
+                    with ThreadPoolExecutor(max_workers=REPAIR_WORKERS) as executor:
+                        futures = {
+                            executor.submit(repair_paper, paper_info, filepath, source_stats,
+                                            arxiv_urls.get(arxiv_ids[paper_id], []) if arxiv_ids[paper_id] else None):
+                                (paper_id, paper_info, filepath)
+                            for paper_id, paper_info, filepath in to_download
+                        }
+                        for future in tqdm(as_completed(futures), total=len(futures), desc="下载进度"):
+                            paper_id, paper_info, filepath = futures[future]
+                            source = future.result()
+                            if not source:
+                                print(f"\n所有来源都下载失败: {paper_info['title']}")
+                                failed_papers.append((paper_id, paper_info))
+                                continue
+                        
+                            print(f"\n从{SOURCE_NAMES[source]}成功下载: {paper_info['title']}")
+                            sha256 = pdf_store.try_ingest(filepath)
+                            if sha256 and sha256 != paper_info.get("sha256"):
+                                db.put(paper_id, dict(paper_info, sha256=sha256))
+                            manifest.record(paper_id, filepath)
+                            success_count += 1
+                
+                    if to_download:
+                        source_stats.save()
+                        print(f"\n各来源成功次数: {source_stats.summary()}")
+                    print(f"\n重新下载完成: 成功 {success_count} 篇，失败 {len(missing_papers) - success_count} 篇")
+                    manifest.save()
                 
-                print(f"\n重新下载完成: 成功 {success_count} 篇，失败 {len(missing_papers) - success_count} 篇")
+                    cache = citation_cache.get_default_cache()
+                    cache.save()
+                    print(f"引用缓存: {cache.summary()}")
                 
-                # 如果有下载失败的论文，询问是否从数据库中移除
-                if failed_papers:
-                    try:
-                        choice = input("\n是否从数据库中移除无法下载的论文记录？(y/n): ").lower().strip()
-                        if choice == 'y':
-                            clean_database(db_path, failed_papers)
-                    except (KeyboardInterrupt, EOFError):
-                        print("\n操作已取消")
+                    # 如果有下载失败的论文，询问是否从数据库中移除
+                    if failed_papers:
+                        try:
+                            choice = input("\n是否从数据库中移除无法下载的论文记录？(y/n): ").lower().strip()
+                            if choice == 'y':
+                                clean_database(db, failed_papers)
+                        except (KeyboardInterrupt, EOFError):
+                            print("\n操作已取消")
                         
-            except (KeyboardInterrupt, EOFError):
-                print("\n操作已取消")
-        else:
-            print("\n所有论文PDF文件都已正确下载")
+                except (KeyboardInterrupt, EOFError):
+                    print("\n操作已取消")
+            else:
+                print("\n所有论文PDF文件都已正确下载")
+        finally:
+            db.close()
     
     except Exception as e:
         print(f"\n程序执行出错: {str(e)}")
@@ -239,8 +470,14 @@ def check_and_fix_papers():
         print("\n\n程序已被用户中断")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="检查并修复已下载的论文")
+    parser.add_argument("--verify", action="store_true", help="检查PDF文件结构，重新下载损坏的文件")
+    parser.add_argument("--deep", action="store_true", help="深度检查（隐含--verify）")
+    parser.add_argument("--workers", type=int, default=None, help="检查文件结构的进程数")
+    args = parser.parse_args()
+    
     try:
-        check_and_fix_papers()
+        check_and_fix_papers(verify=args.verify or args.deep, deep=args.deep, workers=args.workers)
     except KeyboardInterrupt:
         print("\n\n程序已被用户中断")
     except Exception as e:
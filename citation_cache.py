@@ -0,0 +1,156 @@
+"""
+引用信息的本地缓存
+
+以arXiv ID、Semantic Scholar paperId或规范化标题为键，缓存引用数、
+Semantic Scholar链接和年份。支持过期时间(TTL)、容量上限(LRU淘汰)和命中统计，
+跨次运行持久化在JSON文件中。
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+CACHE_PATH = "citation_cache.json"    # 默认缓存文件
+CACHE_TTL = 7 * 24 * 3600             # 默认过期时间（秒）
+CACHE_MAX_ENTRIES = 50000             # 默认最大条目数
+
+def normalize_title(title: str) -> str:
+    """规范化标题：小写、去掉标点、合并空白"""
+    title = re.sub(r'[^0-9a-z]+', ' ', (title or '').lower())
+    return ' '.join(title.split())
+
+def arxiv_key(arxiv_id: str) -> str:
+    """arXiv ID对应的缓存键（去掉版本号）"""
+    return "arxiv:" + re.sub(r'v\d+$', '', arxiv_id)
+
+def s2_key(paper_id: str) -> str:
+    """Semantic Scholar paperId对应的缓存键"""
+    return "s2:" + paper_id
+
+def title_key(title: str) -> str:
+    """标题对应的缓存键"""
+    return "title:" + normalize_title(title)
+
+def s2_id_from_url(url: Optional[str]) -> Optional[str]:
+    """从Semantic Scholar论文链接中取出paperId"""
+    if not url:
+        return None
+    return url.rstrip('/').rsplit('/', 1)[-1] or None
+
+class CitationCache:
+    """带TTL和LRU淘汰的引用信息缓存"""
+
+    def __init__(self, path: str = CACHE_PATH, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # 多个线程同时保存时依次写入，后取的快照总是最后写入
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        """从磁盘加载缓存，文件损坏时从空缓存开始"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # 文件中按最近使用顺序保存，最后一项为最近使用
+            for key, entry in data.get("entries", []):
+                self._entries[key] = entry
+        except (OSError, ValueError) as e:
+            print(f"读取引用缓存失败，将重新建立: {str(e)}")
+            self._entries.clear()
+
+    def get(self, *keys: str) -> Optional[Dict]:
+        """
+        按顺序查找多个键，返回第一个未过期的条目
+
+        返回:
+            {"citation_count", "semantic_scholar_url", "year"}，未命中时返回None
+        """
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                if self.ttl is not None and now - entry["fetched_at"] > self.ttl:
+                    del self._entries[key]
+                    self.stats["expired"] += 1
+                    self._dirty = True
+                    continue
+                self._entries.move_to_end(key)
+                self._dirty = True
+                self.stats["hits"] += 1
+                return {
+                    "citation_count": entry["citation_count"],
+                    "semantic_scholar_url": entry["semantic_scholar_url"],
+                    "year": entry.get("year")
+                }
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, keys: List[str], citation_count: int, semantic_scholar_url: Optional[str],
+            year: Optional[int] = None):
+        """以多个键保存同一条引用信息，超过容量时淘汰最久未使用的条目"""
+        entry = {
+            "citation_count": citation_count,
+            "semantic_scholar_url": semantic_scholar_url,
+            "year": year,
+            "fetched_at": time.time()
+        }
+        with self._lock:
+            for key in keys:
+                if not key or key.endswith(':'):
+                    continue
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while self.max_entries and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._dirty = True
+
+    def save(self):
+        """写回磁盘（临时文件+重命名，避免写一半的缓存文件）"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {"entries": [[key, entry] for key, entry in self._entries.items()]}
+                self._dirty = False
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"保存引用缓存失败: {str(e)}")
+
+    def __len__(self):
+        return len(self._entries)
+
+    def summary(self) -> str:
+        """返回命中统计的简短描述"""
+        total = self.stats["hits"] + self.stats["misses"]
+        rate = self.stats["hits"] / total * 100 if total else 0
+        return (f"命中 {self.stats['hits']}，未命中 {self.stats['misses']}（命中率 {rate:.1f}%），"
+                f"过期 {self.stats['expired']}，淘汰 {self.stats['evictions']}，当前条目 {len(self)}")
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> CitationCache:
+    """返回进程内共享的默认缓存"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = CitationCache()
+        return _default_cache
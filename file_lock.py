@@ -0,0 +1,101 @@
+"""
+跨进程文件锁
+
+多个下载任务同时运行时，用来保护共享的数据库文件和未完成的下载。
+POSIX上使用fcntl.flock，Windows上使用msvcrt.locking。
+"""
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """
+    基于锁文件的互斥锁，同时在进程内和进程间互斥
+
+    用法:
+        with FileLock("papers_db.json.lock"):
+            ...
+    """
+
+    def __init__(self, path: str, remove_on_release: bool = False):
+        """
+        参数:
+            path: 锁文件路径
+            remove_on_release: 释放时删除锁文件（用于数量不固定的锁，避免锁文件堆积）
+        """
+        self.path = path
+        self.remove_on_release = remove_on_release and fcntl is not None
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd = self._open_and_lock()
+            self._fd = fd
+        self._depth += 1
+
+    def _open_and_lock(self) -> int:
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                    # 锁文件可能在等待期间被上一个持有者删除，此时锁住的是旧文件，需要重新打开
+                    if self.remove_on_release:
+                        try:
+                            same_file = os.fstat(fd).st_ino == os.stat(self.path).st_ino
+                        except FileNotFoundError:
+                            same_file = False
+                        if not same_file:
+                            os.close(fd)
+                            continue
+                else:
+                    # msvcrt.LK_LOCK最多重试10秒，持续等待直到拿到锁
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    while True:
+                        try:
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            except BaseException:
+                os.close(fd)
+                self._thread_lock.release()
+                raise
+            return fd
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if self.remove_on_release:
+                    # 仍持有锁时删除，等待者会发现文件已变化并重新打开
+                    try:
+                        os.remove(self.path)
+                    except OSError:
+                        pass
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+                else:
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            finally:
+                os.close(self._fd)
+                self._fd = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
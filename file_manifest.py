@@ -0,0 +1,246 @@
+"""
+下载文件清单
+
+记录下载目录中每个PDF的相对路径、大小、修改时间和inode，以及数据库记录对应的文件，
+持久化在数据库旁边的 *.files.json 中：
+- 下载器写完文件后调用record()登记，check_papers可以按记录直接找到文件，
+  不同会话中的同名文件不会混淆
+- scan()增量扫描：只重新列出修改时间变化了的目录，未变化的目录沿用清单中的内容，
+  大型文献库的检查只需要对目录做stat
+
+多个进程同时写清单时，save()在文件锁内重新读取清单并只合并本进程的改动。
+"""
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+from file_lock import FileLock
+from paper_db import write_json_atomic
+
+MANIFEST_SUFFIX = ".files.json"   # 清单文件后缀（与数据库文件同名）
+LOCK_SUFFIX = ".lock"
+
+def manifest_path_for(db_path: str) -> str:
+    """数据库对应的文件清单路径，如 papers_db.json -> papers_db.files.json"""
+    return os.path.splitext(db_path)[0] + MANIFEST_SUFFIX
+
+def _file_info(st: os.stat_result) -> Dict:
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+def _empty_dir_entry() -> Dict:
+    # mtime_ns为None的目录在下次扫描时一定会被重新列出
+    return {"mtime_ns": None, "subdirs": [], "files": {}}
+
+class FileManifest:
+    """
+    PDF文件清单
+
+    路径都相对于清单文件所在目录保存，使用正斜杠分隔。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.stats = {"dirs_checked": 0, "dirs_rescanned": 0}
+        self._lock = FileLock(path + LOCK_SUFFIX)
+        self._data = None
+        self._by_name = None
+        self._claimed = None
+        # 尚未保存的改动：整个目录的新内容、单个文件的登记、记录与文件的对应
+        self._dir_updates: Dict[str, Optional[Dict]] = {}
+        self._file_updates: Dict[str, Dict[str, Dict]] = {}
+        self._paper_updates: Dict[str, Optional[str]] = {}
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, "/")
+
+    def abspath(self, relpath: str) -> str:
+        """清单中的相对路径对应的实际路径"""
+        return os.path.join(self.base_dir, *relpath.split("/"))
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data.setdefault("dirs", {})
+        data.setdefault("papers", {})
+        return data
+
+    def _apply(self, data: Dict, dir_updates: Dict, file_updates: Dict, paper_updates: Dict):
+        for reldir, entry in dir_updates.items():
+            if entry is None:
+                data["dirs"].pop(reldir, None)
+            else:
+                data["dirs"][reldir] = entry
+        for reldir, files in file_updates.items():
+            entry = data["dirs"].setdefault(reldir, _empty_dir_entry())
+            entry["files"].update(files)
+        for paper_id, relpath in paper_updates.items():
+            if relpath is None:
+                data["papers"].pop(paper_id, None)
+            else:
+                data["papers"][paper_id] = relpath
+
+    @property
+    def data(self) -> Dict:
+        """清单内容（首次访问时加载，并包含尚未保存的改动）"""
+        if self._data is None:
+            self._data = self._read()
+            self._apply(self._data, self._dir_updates, self._file_updates, self._paper_updates)
+        return self._data
+
+    def record(self, paper_id: str, filepath: str):
+        """登记下载器刚写完的文件及其对应的数据库记录"""
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return
+        relpath = self._relpath(filepath)
+        reldir, name = relpath.rsplit("/", 1) if "/" in relpath else ("", relpath)
+        files = {name: _file_info(st)}
+        self._file_updates.setdefault(reldir, {}).update(files)
+        self._paper_updates[paper_id] = relpath
+        if self._data is not None:
+            self._apply(self._data, {}, {reldir: files}, {paper_id: relpath})
+        self._by_name = None
+        self._claimed = None
+
+    def update_file(self, relpath: str, st: os.stat_result, **extra):
+        """更新清单中文件的大小、修改时间等信息，并附加额外字段（如校验结果）"""
+        reldir, name = relpath.rsplit("/", 1) if "/" in relpath else ("", relpath)
+        info = dict(_file_info(st), **extra)
+        self._file_updates.setdefault(reldir, {})[name] = info
+        self._apply(self.data, {}, {reldir: {name: info}}, {})
+
+    def _list_dir(self, absdir: str, mtime_ns: int, previous: Optional[Dict]) -> Dict:
+        entry = {"mtime_ns": mtime_ns, "subdirs": [], "files": {}}
+        old_files = previous["files"] if previous else {}
+        with os.scandir(absdir) as it:
+            for item in it:
+                try:
+                    if item.is_dir(follow_symlinks=False):
+                        entry["subdirs"].append(item.name)
+                    elif item.name.lower().endswith(".pdf") and item.is_file():
+                        info = _file_info(item.stat())
+                        old = old_files.get(item.name)
+                        # 未变化的文件保留附加信息（如校验结果）
+                        if old and all(old.get(k) == info[k] for k in ("size", "mtime_ns", "ino")):
+                            info = old
+                        entry["files"][item.name] = info
+                except OSError:
+                    continue
+        return entry
+
+    def scan(self, roots: Iterable[str]) -> int:
+        """
+        增量扫描下载目录
+
+        从各个根目录开始遍历，目录的修改时间与清单一致时直接沿用清单中的文件和子目录，
+        否则重新列出该目录。已不存在的目录从清单中移除。
+        下载器登记过的其他目录（如自定义的下载目录）也会一起检查。
+
+        返回:
+            清单中的PDF文件数量
+        """
+        dirs = self.data["dirs"]
+        relroots = {self._relpath(root) for root in roots}
+        # 清单中没有上级目录的目录也作为根目录
+        relroots.update(reldir for reldir in dirs
+                        if not any(reldir.startswith(other + "/") for other in relroots)
+                        and ("/" not in reldir or reldir.rsplit("/", 1)[0] not in dirs))
+        seen = set()
+        for relroot in relroots:
+            if not os.path.isdir(self.abspath(relroot)):
+                continue
+            stack = [relroot]
+            while stack:
+                reldir = stack.pop()
+                seen.add(reldir)
+                self.stats["dirs_checked"] += 1
+                try:
+                    # 先stat再列目录：列目录期间新增的文件会让下次扫描看到不同的修改时间
+                    mtime_ns = os.stat(self.abspath(reldir)).st_mtime_ns
+                except OSError:
+                    continue
+                entry = dirs.get(reldir)
+                if entry is None or entry.get("mtime_ns") != mtime_ns:
+                    try:
+                        entry = self._list_dir(self.abspath(reldir), mtime_ns, entry)
+                    except OSError:
+                        continue
+                    dirs[reldir] = entry
+                    self._dir_updates[reldir] = entry
+                    self._file_updates.pop(reldir, None)
+                    self.stats["dirs_rescanned"] += 1
+                stack.extend(f"{reldir}/{name}" for name in entry["subdirs"])
+
+        for reldir in list(dirs):
+            in_roots = any(reldir == prefix or reldir.startswith(prefix + "/") for prefix in relroots)
+            if in_roots and reldir not in seen:
+                del dirs[reldir]
+                self._dir_updates[reldir] = None
+                self._file_updates.pop(reldir, None)
+        self._by_name = None
+        self._claimed = None
+        return self.pdf_count()
+
+    def pdf_count(self) -> int:
+        """清单中的PDF文件数量"""
+        return sum(len(entry["files"]) for entry in self.data["dirs"].values())
+
+    def files(self) -> Iterable[tuple]:
+        """遍历清单中的文件，返回(相对路径, 文件信息)"""
+        for reldir, entry in self.data["dirs"].items():
+            for name, info in entry["files"].items():
+                yield (f"{reldir}/{name}" if reldir else name), info
+
+    def file_info(self, relpath: str) -> Optional[Dict]:
+        """清单中文件的信息，不存在时返回None"""
+        reldir, name = relpath.rsplit("/", 1) if "/" in relpath else ("", relpath)
+        entry = self.data["dirs"].get(reldir)
+        return entry["files"].get(name) if entry else None
+
+    def locate(self, paper_id: str, filename: str) -> Optional[str]:
+        """
+        查找数据库记录对应的文件
+
+        优先使用下载时登记的路径，登记的文件已不存在时视为缺失；
+        没有登记的旧记录按文件名匹配，跳过已被其他记录登记的文件，匹配结果会登记下来供下次使用。
+
+        返回:
+            文件的相对路径，找不到时返回None
+        """
+        relpath = self.data["papers"].get(paper_id)
+        if relpath:
+            return relpath if self.file_info(relpath) is not None else None
+
+        if self._by_name is None:
+            self._by_name = {}
+            for path, _ in self.files():
+                self._by_name.setdefault(path.rsplit("/", 1)[-1], []).append(path)
+        if self._claimed is None:
+            self._claimed = set(self.data["papers"].values())
+        relpath = next((path for path in self._by_name.get(filename, []) if path not in self._claimed), None)
+        if relpath is None:
+            return None
+        self._paper_updates[paper_id] = relpath
+        self.data["papers"][paper_id] = relpath
+        self._claimed.add(relpath)
+        return relpath
+
+    def save(self):
+        """在文件锁内把本进程的改动合并进磁盘上的清单"""
+        if not (self._dir_updates or self._file_updates or self._paper_updates):
+            return
+        with self._lock:
+            data = self._read()
+            self._apply(data, self._dir_updates, self._file_updates, self._paper_updates)
+            write_json_atomic(self.path, data, indent=None)
+        self._data = data
+        self._by_name = None
+        self._claimed = None
+        self._dir_updates = {}
+        self._file_updates = {}
+        self._paper_updates = {}
@@ -0,0 +1,148 @@
+"""
+共享的HTTP传输层
+
+所有下载器通过这里发起网络请求。每个主机复用一个带连接池的Session，
+避免每次请求都重新进行TCP和TLS握手。配置了限速的主机（默认为Semantic Scholar API）
+会经过共享的令牌桶，遇到429时自动退避重试。
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import rate_limiter
+
+# 连接池配置
+POOL_CONNECTIONS = 10      # 每个Session缓存的连接池数量
+POOL_MAXSIZE = 20          # 每个连接池保持的最大连接数（应不小于并发线程数）
+CONNECT_TIMEOUT = 10       # 建立连接的超时时间（秒）
+READ_TIMEOUT = 30          # 读取响应的超时时间（秒）
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive'
+}
+
+# Semantic Scholar API限速配置（请求/秒），设置API Key后使用更高的速率
+S2_API_HOST = "api.semanticscholar.org"
+S2_API_KEY = os.environ.get("SEMANTIC_SCHOLAR_API_KEY")
+S2_RATE = 1.0
+S2_MAX_RATE = 3.0
+S2_RATE_WITH_KEY = 5.0
+S2_MAX_RATE_WITH_KEY = 20.0
+MAX_THROTTLE_RETRIES = 5   # 收到429后的最大重试次数
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+def configure(pool_connections: Optional[int] = None, pool_maxsize: Optional[int] = None,
+              connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+              headers: Optional[Dict[str, str]] = None):
+    """
+    调整连接池参数，已创建的Session会被关闭并按新参数重建
+
+    参数:
+        pool_connections: 每个Session缓存的连接池数量
+        pool_maxsize: 每个连接池的最大连接数
+        connect_timeout: 连接超时（秒）
+        read_timeout: 读取超时（秒）
+        headers: 额外的默认请求头
+    """
+    global POOL_CONNECTIONS, POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT
+    if pool_connections is not None:
+        POOL_CONNECTIONS = pool_connections
+    if pool_maxsize is not None:
+        POOL_MAXSIZE = pool_maxsize
+    if connect_timeout is not None:
+        CONNECT_TIMEOUT = connect_timeout
+    if read_timeout is not None:
+        READ_TIMEOUT = read_timeout
+    if headers:
+        DEFAULT_HEADERS.update(headers)
+    close_all()
+
+def default_timeout() -> Tuple[float, float]:
+    """返回(连接超时, 读取超时)"""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+def configure_s2_rate_limit(api_key: Optional[str] = None):
+    """按是否配置了API Key设置Semantic Scholar的限速器"""
+    global S2_API_KEY
+    if api_key:
+        S2_API_KEY = api_key
+        close_all()
+    if S2_API_KEY:
+        rate_limiter.configure_host(S2_API_HOST, S2_RATE_WITH_KEY, max_rate=S2_MAX_RATE_WITH_KEY)
+    else:
+        rate_limiter.configure_host(S2_API_HOST, S2_RATE, max_rate=S2_MAX_RATE)
+
+def _create_session(host: str) -> requests.Session:
+    """创建带连接池的Session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    if host == S2_API_HOST and S2_API_KEY:
+        session.headers["x-api-key"] = S2_API_KEY
+    return session
+
+def get_session(url: str) -> requests.Session:
+    """获取URL所属主机的共享Session"""
+    host = urlparse(url).netloc.lower()
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _create_session(host)
+            _sessions[host] = session
+        return session
+
+def request(method: str, url: str, timeout=None, **kwargs) -> requests.Response:
+    """
+    通过共享Session发送请求，未指定timeout时使用分开的连接/读取超时
+
+    限速主机的请求先从令牌桶取令牌，收到429时降低速率并带抖动地退避重试，
+    重试次数用尽后返回最后一次的429响应
+    """
+    if timeout is None:
+        timeout = default_timeout()
+    session = get_session(url)
+    limiter = rate_limiter.get_limiter(url)
+    if limiter is None:
+        return session.request(method, url, timeout=timeout, **kwargs)
+
+    for attempt in range(MAX_THROTTLE_RETRIES + 1):
+        limiter.acquire()
+        response = session.request(method, url, timeout=timeout, **kwargs)
+        if response.status_code != 429:
+            limiter.on_success()
+            return response
+
+        limiter.on_throttle(rate_limiter.parse_retry_after(response.headers.get('Retry-After')))
+        if attempt == MAX_THROTTLE_RETRIES:
+            break
+        response.close()
+        time.sleep(rate_limiter.backoff_delay(attempt))
+    return response
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET请求"""
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    """POST请求"""
+    return request("POST", url, **kwargs)
+
+def close_all():
+    """关闭所有Session并释放连接"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+configure_s2_rate_limit()
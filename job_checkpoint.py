@@ -0,0 +1,135 @@
+"""
+下载任务检查点
+
+长时间的下载任务把进度保存在会话目录中的checkpoint.json：搜索条件、搜索进度、
+已查询过引用信息的候选论文和已完成的下载。任务中断后用 --resume 从中断处继续，
+已完成的搜索翻页、引用查询和下载不会重复；任务正常结束后检查点被删除。
+
+在线程中运行的任务（如batch_runner）无法收到Ctrl-C，由调用方设置cancel事件，
+任务在check_cancelled()处抛出JobCancelled，与Ctrl-C一样保存检查点后退出。
+"""
+import dataclasses
+import json
+import os
+import threading
+import time
+from enum import Enum
+from typing import Dict, Optional
+
+from paper_db import write_json_atomic
+
+CHECKPOINT_FILE = "checkpoint.json"
+SAVE_INTERVAL = 2           # 两次保存之间的最短间隔（秒），中断或阶段结束时总会保存
+CHECKPOINT_VERSION = 1
+
+def criteria_to_dict(criteria) -> Dict:
+    """把SearchCriteria转换为可保存的字典（枚举保存其值）"""
+    return {
+        field.name: value.value if isinstance(value, Enum) else value
+        for field, value in ((f, getattr(criteria, f.name)) for f in dataclasses.fields(criteria))
+    }
+
+def criteria_from_dict(cls, data: Dict):
+    """由criteria_to_dict的结果恢复SearchCriteria"""
+    values = {}
+    for field in dataclasses.fields(cls):
+        if field.name not in data:
+            continue
+        value = data[field.name]
+        if isinstance(field.type, type) and issubclass(field.type, Enum) and value is not None:
+            value = field.type(value)
+        values[field.name] = value
+    return cls(**values)
+
+class Checkpoint:
+    """
+    一次下载任务的检查点
+
+    state是任务自行维护的字典，save()把它原子写入检查点文件。
+    """
+
+    def __init__(self, path: str, state: Dict):
+        self.path = path
+        self.state = state
+        self._last_save = 0.0
+
+    @classmethod
+    def create(cls, session_dir: str, kind: str, criteria, **state) -> "Checkpoint":
+        """为新任务创建检查点（此时尚未写入文件）"""
+        state = dict(state, version=CHECKPOINT_VERSION, kind=kind, criteria=criteria_to_dict(criteria),
+                     session_dir=session_dir)
+        return cls(os.path.join(session_dir, CHECKPOINT_FILE), state)
+
+    @classmethod
+    def load(cls, path: str, kind: str) -> "Checkpoint":
+        """
+        读取检查点
+
+        参数:
+            path: 检查点文件或其所在的会话目录
+            kind: 任务类型，与检查点不符时报错
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, CHECKPOINT_FILE)
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("kind") != kind:
+            raise ValueError(f"检查点 {path} 不是{kind}下载任务的检查点")
+        return cls(path, state)
+
+    def criteria(self, cls):
+        """检查点中保存的搜索条件"""
+        return criteria_from_dict(cls, self.state["criteria"])
+
+    def save(self, force: bool = False):
+        """保存检查点，force为False时距上次保存不足SAVE_INTERVAL秒则跳过"""
+        now = time.monotonic()
+        if not force and now - self._last_save < SAVE_INTERVAL:
+            return
+        write_json_atomic(self.path, self.state, indent=None)
+        self._last_save = now
+
+    def remove(self):
+        """任务完成后删除检查点"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+class JobCancelled(KeyboardInterrupt):
+    """任务被调用方取消（按用户中断处理）"""
+
+def check_cancelled(cancel: Optional[threading.Event]):
+    """cancel已被设置时抛出JobCancelled"""
+    if cancel is not None and cancel.is_set():
+        raise JobCancelled()
+
+def find_latest(base_dir: str) -> Optional[str]:
+    """下载目录中最近一次未完成任务的检查点路径，没有时返回None"""
+    latest = None
+    latest_mtime = None
+    try:
+        entries = list(os.scandir(base_dir))
+    except OSError:
+        return None
+    for entry in entries:
+        path = os.path.join(entry.path, CHECKPOINT_FILE)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            continue
+        if latest_mtime is None or mtime > latest_mtime:
+            latest, latest_mtime = path, mtime
+    return latest
+
+def resolve_resume_path(resume: Optional[str], base_dir: str) -> str:
+    """
+    解析 --resume 参数：未指定路径时使用下载目录中最近的检查点
+
+    异常:
+        FileNotFoundError: 没有可以继续的任务
+    """
+    path = resume or find_latest(base_dir)
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"没有找到可以继续的下载任务（{resume or base_dir}）")
+    return path
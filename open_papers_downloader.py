@@ -1,13 +1,34 @@
+import argparse
 import requests
 import os
-import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from tqdm import tqdm
 from dataclasses import dataclass
-from typing import List, Optional, Dict
+from typing import Callable, List, Optional, Dict
 from enum import Enum
 
+import file_manifest
+import http_client
+import job_checkpoint
+import paper_db
+import paper_identity
+import pdf_fetcher
+import pdf_store
+import rate_limiter
+import retry_queue
+
+SEARCH_PAGE_WORKERS = 4  # 并发请求搜索结果页的线程数（实际速率仍受限速器控制）
+BULK_SEARCH_URL = "https://api.semanticscholar.org/graph/v1/paper/search/bulk"
+PAPER_BATCH_URL = "https://api.semanticscholar.org/graph/v1/paper/batch"
+PAPER_BATCH_LIMIT = 500  # 批量接口单次最多查询的论文数
+
+# 两阶段字段：搜索时只取过滤、排序和去重所需的字段，筛选后再为留下的论文补全其余字段
+SEARCH_FIELDS = "title,authors,year,citationCount,openAccessPdf,externalIds"
+HYDRATE_FIELDS = "abstract,venue"
+
 class SortOrder(Enum):
     """论文排序方式"""
     RELEVANCE = "relevance"
@@ -32,8 +53,11 @@ class SearchCriteria:
     max_citations: Optional[int] = None
     exclude_keywords: Optional[List[str]] = None
     include_keywords: Optional[List[str]] = None
+    fields_of_study: Optional[List[str]] = None  # Semantic Scholar学科分类
+    venues: Optional[List[str]] = None           # 期刊/会议
     sort_by: SortOrder = SortOrder.RELEVANCE
     max_results: int = 20
+    bulk: bool = False                           # 使用批量检索接口（不限10页，适合获取大量候选论文）
 
 def get_preset_keywords() -> dict:
     """返回预设的关键词组合"""
@@ -216,16 +240,12 @@ def get_preset_keywords() -> dict:
     }
 
 def load_paper_database(db_path):
-    """加载论文数据库"""
-    if os.path.exists(db_path):
-        with open(db_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {"papers": {}}
+    """加载论文数据库（JSON或SQLite，见paper_db）"""
+    return paper_db.open_paper_store(db_path)
 
-def save_paper_database(db_path, data):
-    """保存论文数据库"""
-    with open(db_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def save_paper_database(db, paper_id, record):
+    """保存一篇论文的记录"""
+    db.put(paper_id, record)
 
 def get_user_input(prompt: str, default: str = "", allow_null: bool = False) -> str:
     """获取用户输入"""
@@ -275,7 +295,7 @@ def get_keywords_input() -> str:
             return presets["1"]["keywords"]
 
 def get_paper_categories() -> List[str]:
-    """返回论文分类列表"""
+    """返回论文分类列表（均为Semantic Scholar的fieldsOfStudy取值）"""
     return [
         "Computer Science",
         "Mathematics",
@@ -286,7 +306,7 @@ def get_paper_categories() -> List[str]:
         "Economics",
         "Business",
         "Psychology",
-        "Social Sciences"
+        "Sociology"
     ]
 
 def get_sort_order() -> SortOrder:
@@ -365,64 +385,77 @@ def build_search_query(criteria: SearchCriteria) -> str:
         abstract_parts = [f'abstract:"{k.strip()}"' for k in criteria.abstract_keywords.split(" OR ")]
         query_parts.append("(" + " OR ".join(abstract_parts) + ")")
     
-    # 年份限制
-    if criteria.year_from or criteria.year_to:
-        year_from = criteria.year_from or 1900
-        year_to = criteria.year_to or datetime.now().year
-        query_parts.append(f'year:[{year_from} TO {year_to}]')
+    # 年份、引用数等限制通过build_search_filters作为API参数传递
     
     # 组合所有查询条件
     final_query = " AND ".join(f"({part})" for part in query_parts) if query_parts else "*"
     print(f"\n生成的查询语句: {final_query}")
     return final_query
 
-def validate_pdf(filepath: str) -> bool:
-    """验证下载的文件是否为有效的PDF"""
-    try:
-        with open(filepath, 'rb') as f:
-            header = f.read(4)
-            return header.startswith(b'%PDF')
-    except Exception:
-        return False
-
-def download_paper(url: str, filepath: str, timeout: int = 30) -> bool:
-    """下载论文，带有重试机制和PDF验证"""
+def build_search_filters(criteria: SearchCriteria) -> Dict:
+    """
+    构建Semantic Scholar搜索接口的过滤参数
+    
+    能由API完成的过滤放到服务端，只传输可能通过过滤的论文；
+    最大引用数和包含/排除关键词等API不支持的条件仍在filter_papers中处理
+    """
+    filters = {
+        # 只返回有开放获取PDF的论文
+        "openAccessPdf": ""
+    }
+    
+    if criteria.year_from or criteria.year_to:
+        filters["year"] = f"{criteria.year_from or ''}-{criteria.year_to or ''}"
+    
+    if criteria.min_citations:
+        filters["minCitationCount"] = criteria.min_citations
+    
+    if criteria.fields_of_study:
+        filters["fieldsOfStudy"] = ",".join(criteria.fields_of_study)
+    
+    if criteria.venues:
+        filters["venue"] = ",".join(criteria.venues)
+    
+    return filters
+
+def download_paper(url: str, filepath: str, timeout=None) -> Optional[Exception]:
+    """
+    下载论文，带有重试机制和PDF验证（timeout为None时使用连接池的默认超时）
+    
+    返回:
+        成功时返回None，失败时返回最后一次的异常（用于记入重试队列）
+    """
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, timeout=timeout)
-            response.raise_for_status()
-            
-            # 验证Content-Type
-            if 'application/pdf' not in response.headers.get('content-type', ''):
-                print(f"警告：响应不是PDF格式 (Content-Type: {response.headers.get('content-type')})")
-                return False
-            
-            # 保存文件
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            # 流式写入临时文件，校验Content-Type和PDF文件头后原子重命名
+            pdf_fetcher.stream_pdf(url, filepath, timeout=timeout)
+            return None
             
-            # 验证PDF文件
-            if not validate_pdf(filepath):
-                print("警告：下载的文件不是有效的PDF格式")
-                os.remove(filepath)  # 删除无效文件
-                return False
-                
-            return True
+        except pdf_fetcher.NotPdfError as e:
+            print(f"警告：{str(e)}")
+            return e
                 
         except requests.exceptions.RequestException as e:
             if attempt == max_retries - 1:
                 print(f"下载失败 (尝试 {attempt + 1}/{max_retries}): {str(e)}")
-                return False
+                return e
             print(f"下载失败，正在重试 ({attempt + 1}/{max_retries})...")
-            time.sleep(2 ** attempt)  # 指数退避
-    return False
+            time.sleep(rate_limiter.backoff_delay(attempt))  # 带抖动的指数退避
 
 def create_session_dir(base_dir: str, criteria: SearchCriteria) -> tuple:
     """创建下载会话目录并生成说明文件"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     session_dir = os.path.join(base_dir, f"semantic_scholar_{timestamp}")
-    os.makedirs(session_dir, exist_ok=True)
+    # 批量任务可能在同一秒内创建多个会话目录
+    suffix = 1
+    while True:
+        try:
+            os.makedirs(session_dir)
+            break
+        except FileExistsError:
+            suffix += 1
+            session_dir = os.path.join(base_dir, f"semantic_scholar_{timestamp}_{suffix}")
     
     # 创建说明文件
     readme_path = os.path.join(session_dir, "download_info.md")
@@ -438,8 +471,11 @@ def create_session_dir(base_dir: str, criteria: SearchCriteria) -> tuple:
         f.write(f"- 排除关键词: {', '.join(criteria.exclude_keywords) if criteria.exclude_keywords else '无'}\n")
         f.write(f"- 引用数范围: {criteria.min_citations or '不限'} - {criteria.max_citations or '不限'}\n")
         f.write(f"- 年份范围: {criteria.year_from or '不限'} - {criteria.year_to or '不限'}\n")
+        f.write(f"- 学科分类: {', '.join(criteria.fields_of_study) if criteria.fields_of_study else '所有'}\n")
+        f.write(f"- 期刊/会议: {', '.join(criteria.venues) if criteria.venues else '不限'}\n")
         f.write(f"- 排序方式: {criteria.sort_by.value}\n")
-        f.write(f"- 最大下载数量: {criteria.max_results}\n\n")
+        f.write(f"- 最大下载数量: {criteria.max_results}\n")
+        f.write(f"- 检索模式: {'批量检索' if criteria.bulk and not criteria.authors else '相关度检索'}\n\n")
         
         f.write("## 下载的论文\n\n")
         f.write("| 序号 | 标题 | 作者 | 年份 | 引用数 | 来源 | 下载状态 |\n")
@@ -456,8 +492,199 @@ def update_download_info(readme_path: str, paper: dict, index: int, status: str
         f.write(f"| {index} | {paper['title']} | {authors} | {paper['year']} | "
                f"{paper['citations']} | {paper.get('venue', 'N/A')} | {status} |\n")
 
-def search_semantic_scholar(criteria: SearchCriteria) -> List[Dict]:
-    """从Semantic Scholar搜索论文"""
+def parse_search_results(data: Dict) -> List[Dict]:
+    """把Semantic Scholar的搜索结果页转换为论文信息列表"""
+    papers = []
+    for paper in data.get('data', []):
+        # 不再只过滤有PDF的论文
+        paper_info = {
+            'title': paper.get('title'),
+            'authors': [author.get('name') for author in paper.get('authors', [])],
+            'year': paper.get('year'),
+            'citations': paper.get('citationCount', 0),
+            'abstract': paper.get('abstract'),
+            'venue': paper.get('venue'),
+            'source_id': paper.get('paperId'),
+            'external_ids': paper.get('externalIds') or {},
+            'has_pdf': bool(paper.get('openAccessPdf'))
+        }
+        # 身份键用于识别从arXiv下载器下载过的同一篇论文
+        paper_info['identifiers'] = paper_identity.keys_from_external_ids(
+            paper_info['source_id'], paper_info['external_ids'], paper_info['title'])
+        
+        if paper.get('openAccessPdf'):
+            paper_info['pdf_url'] = paper['openAccessPdf'].get('url')
+        
+        papers.append(paper_info)
+    return papers
+
+def get_search_fields(criteria: SearchCriteria) -> str:
+    """搜索阶段请求的字段，只有按关键词过滤时才需要摘要"""
+    if criteria.include_keywords or criteria.exclude_keywords:
+        return SEARCH_FIELDS + ",abstract"
+    return SEARCH_FIELDS
+
+def hydrate_papers(papers: List[Dict], fields: str = HYDRATE_FIELDS) -> List[Dict]:
+    """通过批量接口为筛选后的论文补全摘要、来源等字段（失败时保留已有信息）"""
+    papers_with_id = [paper for paper in papers if paper.get('source_id')]
+    headers = {
+        "Accept": "application/json"
+    }
+    
+    for start in range(0, len(papers_with_id), PAPER_BATCH_LIMIT):
+        chunk = papers_with_id[start:start + PAPER_BATCH_LIMIT]
+        try:
+            response = http_client.post(
+                PAPER_BATCH_URL,
+                headers=headers,
+                params={"fields": fields},
+                json={"ids": [paper['source_id'] for paper in chunk]}
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"\n补全论文信息时出错: {str(e)}")
+            continue
+        
+        # 返回结果与请求的ID顺序一致，查不到的为null
+        for paper, details in zip(chunk, response.json()):
+            if not details:
+                continue
+            for field in fields.split(","):
+                if details.get(field) is not None:
+                    paper[field] = details[field]
+    
+    return papers
+
+def fetch_search_page(base_url: str, headers: Dict, params: Dict,
+                      stop_event: Optional[threading.Event] = None) -> Optional[Dict]:
+    """获取一页搜索结果，stop_event已设置时不再发送请求"""
+    if stop_event is not None and stop_event.is_set():
+        return None
+    # 访问频率由http_client的共享限速器控制，429会自动退避重试
+    response = http_client.get(base_url, headers=headers, params=params)
+    response.raise_for_status()
+    return response.json()
+
+def build_bulk_query(criteria: SearchCriteria) -> str:
+    """
+    构建批量检索接口的查询字符串
+    
+    批量检索使用布尔语法：| 表示OR，+ 表示AND，- 表示排除，引号表示短语。
+    该接口不支持按作者检索，指定了作者的搜索由search_semantic_scholar改用相关度检索。
+    """
+    def phrase(text: str) -> str:
+        text = text.strip().strip('"').strip()
+        return f'"{text}"' if ' ' in text else text
+    
+    query_parts = []
+    
+    # 基本关键词：逗号或OR分隔，任意一个匹配即可
+    if criteria.keywords:
+        keywords = [k for k in criteria.keywords.replace(" OR ", ",").split(",") if k.strip()]
+        if keywords:
+            query_parts.append("(" + " | ".join(phrase(k) for k in keywords) + ")")
+    
+    if criteria.title:
+        query_parts.append(phrase(criteria.title))
+    
+    if criteria.abstract_keywords:
+        query_parts.append("(" + " | ".join(phrase(k) for k in criteria.abstract_keywords.split(" OR ")) + ")")
+    
+    if criteria.include_keywords:
+        query_parts.extend(phrase(k) for k in criteria.include_keywords)
+    
+    final_query = " + ".join(query_parts)
+    
+    if criteria.exclude_keywords:
+        final_query += "".join(f" -{phrase(k)}" for k in criteria.exclude_keywords)
+    
+    print(f"\n生成的批量检索语句: {final_query}")
+    return final_query
+
+def get_bulk_sort(sort_by: SortOrder) -> Optional[str]:
+    """批量检索接口支持的服务端排序，不支持的排序方式返回None（之后在本地排序）"""
+    return {
+        SortOrder.CITATIONS: "citationCount:desc",
+        SortOrder.YEAR: "publicationDate:desc",
+    }.get(sort_by)
+
+def search_semantic_scholar_bulk(criteria: SearchCriteria, progress: Optional[Dict] = None,
+                                 on_page: Optional[Callable[[], None]] = None) -> List[Dict]:
+    """
+    使用批量检索接口搜索论文
+    
+    通过continuation token翻页，每页最多1000篇，没有10页的上限。
+    获取到max_results的两倍后停止。
+    
+    参数:
+        progress: 翻页进度（已获取的论文、页数和token），传入检查点中保存的进度时从中断处继续
+        on_page: 每获取一页后调用（用于保存检查点）
+    """
+    headers = {
+        "Accept": "application/json"
+    }
+    params = {
+        "query": build_bulk_query(criteria),
+        "fields": get_search_fields(criteria),
+        **build_search_filters(criteria)
+    }
+    sort = get_bulk_sort(criteria.sort_by)
+    if sort:
+        params["sort"] = sort
+    
+    target_count = criteria.max_results * 2  # 获取两倍于需求的论文以便后续过滤
+    progress = {} if progress is None else progress
+    all_papers = progress.setdefault("papers", [])
+    token = progress.get("token")
+    page = progress.get("page", 0)
+    
+    # 继续中断的搜索时，已经到最后一页则不再请求
+    while len(all_papers) < target_count and (page == 0 or token):
+        page += 1
+        if token:
+            params["token"] = token
+        try:
+            print(f"\r正在获取第 {page} 页批量结果...", end="")
+            data = fetch_search_page(BULK_SEARCH_URL, headers, params)
+        except requests.exceptions.RequestException as e:
+            print(f"\n搜索论文时出错: {str(e)}")
+            break
+        
+        if page == 1:
+            print(f"\n找到 {data.get('total', 0)} 篇相关论文")
+        
+        all_papers.extend(parse_search_results(data))
+        
+        # 没有token表示已经是最后一页
+        token = data.get('token') if data.get('data') else None
+        progress.update(token=token, page=page)
+        if on_page:
+            on_page()
+        if not token:
+            break
+    
+    print(f"\n共获取到 {len(all_papers)} 篇论文")
+    return all_papers[:target_count]
+
+def search_semantic_scholar(criteria: SearchCriteria, page_workers: int = SEARCH_PAGE_WORKERS,
+                            progress: Optional[Dict] = None,
+                            on_page: Optional[Callable[[], None]] = None) -> List[Dict]:
+    """
+    从Semantic Scholar搜索论文
+    
+    先获取第一页得到结果总数，再在限速范围内并发请求其余页，按offset顺序合并。
+    获取到足够的论文后取消尚未完成的请求。criteria.bulk为True时改用批量检索接口，
+    但批量检索不支持按作者检索，指定了作者时仍使用相关度检索。
+    
+    参数:
+        progress: 翻页进度（已合并的论文和页数），传入检查点中保存的进度时从中断处继续
+        on_page: 每合并一页后调用（用于保存检查点）
+    """
+    if criteria.bulk:
+        if not criteria.authors:
+            return search_semantic_scholar_bulk(criteria, progress, on_page)
+        print("\n批量检索不支持按作者检索，改用相关度检索")
+    
     base_url = "https://api.semanticscholar.org/graph/v1/paper/search"
     headers = {
         "Accept": "application/json",
@@ -465,78 +692,78 @@ def search_semantic_scholar(criteria: SearchCriteria) -> List[Dict]:
     }
     
     query = build_search_query(criteria)
+    filters = build_search_filters(criteria)
     
-    # 初始化结果列表
-    all_papers = []
-    total_results = 0
     page_size = 100  # Semantic Scholar的最大页面大小
     max_pages = 10   # 最多获取10页结果
+    target_count = criteria.max_results * 2  # 获取两倍于需求的论文以便后续过滤
     
-    for page in range(max_pages):
-        offset = page * page_size
-        
-        params = {
+    def page_params(page: int) -> Dict:
+        return {
             "query": query,
             "limit": page_size,
-            "offset": offset,
-            "fields": "title,authors,year,abstract,citationCount,openAccessPdf,venue,references",
-            "sort": criteria.sort_by.value
+            "offset": page * page_size,
+            "fields": get_search_fields(criteria),
+            **filters
         }
+    
+    progress = {} if progress is None else progress
+    all_papers = progress.setdefault("papers", [])
+    
+    # 第一页：获取总结果数（继续中断的搜索时使用已保存的进度）
+    if not progress.get("pages"):
+        try:
+            print(f"\r正在获取第 1 页结果...", end="")
+            data = fetch_search_page(base_url, headers, page_params(0))
+        except requests.exceptions.RequestException as e:
+            print(f"\n搜索论文时出错: {str(e)}")
+            return []
         
+        all_papers.extend(parse_search_results(data))
+        progress.update(total=data.get('total', 0), pages=1, more=len(data.get('data', [])) >= page_size)
+        if on_page:
+            on_page()
+    
+    total_results = progress["total"]
+    print(f"\n找到 {total_results} 篇相关论文")
+    
+    # 页面都是满页时，达到目标数量所需的页数之后的页不会被用到
+    last_page = min(max_pages, -(-total_results // page_size), -(-target_count // page_size))
+    
+    # 检查是否已经获取足够的论文或已没有更多结果
+    if len(all_papers) < target_count and progress["more"] and last_page > progress["pages"]:
+        stop_event = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=page_workers)
+        futures = [
+            executor.submit(fetch_search_page, base_url, headers, page_params(page), stop_event)
+            for page in range(progress["pages"], last_page)
+        ]
         try:
-            print(f"\r正在获取第 {page + 1} 页结果...", end="")
-            response = requests.get(base_url, headers=headers, params=params, timeout=30)
-            
-            # 处理频率限制
-            if response.status_code == 429:
-                wait_time = int(response.headers.get('Retry-After', 5))
-                print(f"\n达到API访问限制，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-                continue
+            # 按offset顺序合并结果
+            for page, future in enumerate(futures, progress["pages"] + 1):
+                try:
+                    data = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"\n搜索论文时出错: {str(e)}")
+                    break
                 
-            response.raise_for_status()
-            data = response.json()
-            
-            # 获取总结果数
-            if total_results == 0:
-                total_results = data.get('total', 0)
-                print(f"\n找到 {total_results} 篇相关论文")
-            
-            # 处理当前页的论文
-            current_papers = []
-            for paper in data.get('data', []):
-                # 不再只过滤有PDF的论文
-                paper_info = {
-                    'title': paper.get('title'),
-                    'authors': [author.get('name') for author in paper.get('authors', [])],
-                    'year': paper.get('year'),
-                    'citations': paper.get('citationCount', 0),
-                    'abstract': paper.get('abstract'),
-                    'venue': paper.get('venue'),
-                    'source_id': paper.get('paperId'),
-                    'has_pdf': bool(paper.get('openAccessPdf'))
-                }
+                print(f"\r已获取第 {page} 页结果...", end="")
+                all_papers.extend(parse_search_results(data))
+                progress.update(pages=page, more=len(data.get('data', [])) >= page_size)
+                if on_page:
+                    on_page()
                 
-                if paper.get('openAccessPdf'):
-                    paper_info['pdf_url'] = paper['openAccessPdf'].get('url')
+                # 检查是否已经获取足够的论文
+                if len(all_papers) >= target_count:
+                    break
                 
-                current_papers.append(paper_info)
-            
-            all_papers.extend(current_papers)
-            
-            # 检查是否已经获取足够的论文
-            if len(all_papers) >= criteria.max_results * 2:  # 获取两倍于需求的论文以便后续过滤
-                break
-                
-            # 检查是否还有更多结果
-            if len(data.get('data', [])) < page_size:
-                break
-                
-            time.sleep(1)  # 添加延迟避免触发频率限制
-            
-        except requests.exceptions.RequestException as e:
-            print(f"\n搜索论文时出错: {str(e)}")
-            break
+                # 检查是否还有更多结果
+                if not progress["more"]:
+                    break
+        finally:
+            # 取消尚未开始的请求，正在进行的请求结果直接丢弃
+            stop_event.set()
+            executor.shutdown(wait=False, cancel_futures=True)
     
     print(f"\n共获取到 {len(all_papers)} 篇论文")
     return all_papers
@@ -554,6 +781,7 @@ def filter_papers(papers: List[Dict], criteria: SearchCriteria) -> List[Dict]:
     
     filtered = []
     for paper in papers:
+        # 年份、最小引用数和PDF已由API参数过滤，这里的检查作为兜底
         # 检查是否有PDF
         if not paper.get('has_pdf'):
             filtered_count["no_pdf"] += 1
@@ -599,17 +827,19 @@ def filter_papers(papers: List[Dict], criteria: SearchCriteria) -> List[Dict]:
     
     return filtered[:criteria.max_results]
 
-def search_papers(criteria: SearchCriteria) -> List[Dict]:
-    """统一的论文搜索函数"""
-    papers = search_semantic_scholar(criteria)
+def search_papers(criteria: SearchCriteria, progress: Optional[Dict] = None,
+                  on_page: Optional[Callable[[], None]] = None) -> List[Dict]:
+    """统一的论文搜索函数（progress和on_page用于检查点，见search_semantic_scholar）"""
+    papers = search_semantic_scholar(criteria, progress=progress, on_page=on_page)
     
     # 过滤论文
     filtered_papers = filter_papers(papers, criteria)
     
     # 按指定方式排序
-    sorted_papers = sort_papers(filtered_papers, criteria.sort_by)
+    sorted_papers = sort_papers(filtered_papers, criteria.sort_by)[:criteria.max_results]
     
-    return sorted_papers[:criteria.max_results]
+    # 只为最终留下的论文获取摘要等较大的字段
+    return hydrate_papers(sorted_papers)
 
 def sort_papers(papers: List[Dict], sort_by: SortOrder) -> List[Dict]:
     """根据指定方式排序论文"""
@@ -649,6 +879,7 @@ def interactive_search():
         print(f"{i}. {category}")
     selected_categories = get_multiple_input("请输入分类编号，多个分类用逗号分隔（可选）")
     selected_categories = [categories[int(i)-1] for i in selected_categories if i.isdigit() and 1 <= int(i) <= len(categories)]
+    venues = get_multiple_input("请输入期刊/会议名称，多个用逗号分隔（可选）")
     
     include_keywords = get_multiple_input("请输入必须包含的关键词，用逗号分隔（可选）")
     exclude_keywords = get_multiple_input("请输入要排除的关键词，用逗号分隔（可选）")
@@ -662,6 +893,8 @@ def interactive_search():
     
     sort_by = get_sort_order()
     
+    bulk = get_user_input("是否使用批量检索模式（适合获取大量候选论文，不支持按作者检索）？(y/n)", "n").lower() == 'y'
+    
     # 确认搜索条件
     print("\n=== 搜索条件确认 ===")
     print(f"关键词: {keywords}")
@@ -669,40 +902,19 @@ def interactive_search():
     print(f"作者: {', '.join(authors) if authors else '无'}")
     print(f"摘要关键词: {abstract_keywords if abstract_keywords else '无'}")
     print(f"分类: {', '.join(selected_categories) if selected_categories else '所有'}")
+    print(f"期刊/会议: {', '.join(venues) if venues else '不限'}")
     print(f"必须包含关键词: {', '.join(include_keywords) if include_keywords else '无'}")
     print(f"排除关键词: {', '.join(exclude_keywords) if exclude_keywords else '无'}")
     print(f"引用数范围: {min_citations or '不限'} - {max_citations or '不限'}")
     print(f"年份范围: {year_from or '不限'} - {year_to or '不限'}")
     print(f"排序方式: {sort_by.value}")
     print(f"最大下载数量: {max_results}")
+    print(f"检索模式: {'批量检索' if bulk else '相关度检索'}")
     
     if get_user_input("\n确认开始搜索？(y/n)", "y").lower() != 'y':
         print("已取消搜索")
         return
     
-    # 创建下载目录
-    base_dir = "semantic_scholar_papers"
-    session_dir, readme_path = create_session_dir(base_dir, SearchCriteria(
-        keywords=keywords,
-        title=title,
-        authors=authors,
-        abstract_keywords=abstract_keywords,
-        year_from=int(year_from) if year_from and year_from.isdigit() else None,
-        year_to=int(year_to) if year_to and year_to.isdigit() else None,
-        min_citations=int(min_citations) if min_citations and min_citations.isdigit() else None,
-        max_citations=int(max_citations) if max_citations and max_citations.isdigit() else None,
-        include_keywords=include_keywords,
-        exclude_keywords=exclude_keywords,
-        sort_by=sort_by,
-        max_results=max_results
-    ))
-    db_path = "papers_db.json"
-    
-    # 加载数据库
-    db = load_paper_database(db_path)
-    
-    # 搜索论文
-    print("\n正在搜索论文...")
     criteria = SearchCriteria(
         keywords=keywords,
         title=title,
@@ -714,76 +926,192 @@ def interactive_search():
         max_citations=int(max_citations) if max_citations and max_citations.isdigit() else None,
         include_keywords=include_keywords,
         exclude_keywords=exclude_keywords,
+        fields_of_study=selected_categories,
+        venues=venues,
         sort_by=sort_by,
-        max_results=max_results
+        max_results=max_results,
+        bulk=bulk
     )
+    download_papers(criteria)
+
+def download_papers(criteria: SearchCriteria, download_dir: str = "semantic_scholar_papers",
+                    db_path: str = "papers_db.json", confirm: bool = True,
+                    checkpoint: Optional[job_checkpoint.Checkpoint] = None,
+                    db: Optional[paper_db.PaperStore] = None,
+                    claims: Optional[paper_identity.IdentityClaims] = None,
+                    cancel: Optional[threading.Event] = None):
+    """
+    搜索并下载论文
     
-    papers = search_papers(criteria)
+    任务进度（搜索翻页、筛选后的论文列表和已处理到第几篇）保存在会话目录的检查点中，
+    中断后可用resume_download继续。
     
-    if not papers:
-        print("没有找到符合条件的论文")
-        return
+    参数:
+        download_dir: 下载目录，每次任务在其中创建一个会话目录
+        confirm: 搜索完成后是否询问确认再开始下载
+        checkpoint: 要继续的任务的检查点，为None时开始新任务
+        db: 多个任务共用的数据库（由调用方关闭），为None时按db_path打开
+        claims: 多个任务共用的论文认领表，其他任务已认领的论文不再下载
+        cancel: 在线程中运行时用于中断任务的事件，设置后保存检查点并停止
+    """
+    if checkpoint is None:
+        # 创建下载目录
+        session_dir, readme_path = create_session_dir(download_dir, criteria)
+        checkpoint = job_checkpoint.Checkpoint.create(
+            session_dir, "semantic_scholar", criteria, readme_path=readme_path, db_path=db_path,
+            search={}, papers=None, next_index=1, counts={"success": 0, "skip": 0, "fail": 0}
+        )
+    else:
+        session_dir, readme_path = checkpoint.state["session_dir"], checkpoint.state["readme_path"]
+        print(f"继续未完成的下载任务: {session_dir}")
+    state = checkpoint.state
+    completed = False
     
-    print(f"\n找到 {len(papers)} 篇符合条件的论文")
+    # 加载数据库
+    own_db = db is None
+    if own_db:
+        db = load_paper_database(db_path)
+    manifest = file_manifest.FileManifest(file_manifest.manifest_path_for(db_path))
+    retries = retry_queue.RetryQueue(retry_queue.queue_path_for(db_path))
     
-    # 确认下载
-    if get_user_input("\n确认开始下载？(y/n)", "y").lower() != 'y':
-        print("已取消下载")
-        return
+    def on_page():
+        checkpoint.save()
+        job_checkpoint.check_cancelled(cancel)
     
-    # 下载论文并更新数据库
-    print("\n开始下载论文...")
-    success_count = 0
-    skip_count = 0
-    fail_count = 0
-    
-    for i, paper in enumerate(tqdm(papers), 1):
-        if paper['source_id'] in db["papers"]:
-            print(f"\n论文已存在数据库中，跳过: {paper['title']}")
-            update_download_info(readme_path, paper, i, "已存在")
-            skip_count += 1
-            continue
+    try:
+        papers = state["papers"]
+        if papers is None:
+            # 搜索论文
+            print("\n正在搜索论文...")
+            papers = search_papers(criteria, progress=state["search"], on_page=on_page)
             
-        title = paper['title']
-        safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-        filename = f"{i:02d}-{safe_title[:100]}.pdf"
-        filepath = os.path.join(session_dir, filename)
-        
-        if download_paper(paper['pdf_url'], filepath):
-            update_download_info(readme_path, paper, i, "成功")
-            success_count += 1
+            if not papers:
+                completed = True
+                print("没有找到符合条件的论文")
+                return
+            
+            print(f"\n找到 {len(papers)} 篇符合条件的论文")
             
-            # 更新数据库
-            db["papers"][paper['source_id']] = {
-                "title": paper['title'],
-                "authors": paper['authors'],
-                "year": paper['year'],
-                "citations": paper['citations'],
-                "abstract": paper.get('abstract'),
-                "venue": paper.get('venue'),
-                "filename": filename,
-                "downloaded_date": datetime.now().strftime("%Y-%m-%d"),
-                "source": "semantic_scholar"
-            }
-            save_paper_database(db_path, db)
+            # 确认下载
+            if confirm and get_user_input("\n确认开始下载？(y/n)", "y").lower() != 'y':
+                completed = True
+                print("已取消下载")
+                return
             
-            print(f"\n成功下载: {title}")
+            # 搜索结果已筛选完毕，不再需要翻页进度
+            state.update(papers=papers, search={})
+            checkpoint.save(force=True)
+        
+        # 下载论文并更新数据库
+        print("\n开始下载论文...")
+        counts = state["counts"]
+        start = state["next_index"]
+        
+        # 继续中断的任务时从第一篇未处理的论文开始
+        for i, paper in enumerate(tqdm(papers[start - 1:], initial=start - 1, total=len(papers)), start):
+            job_checkpoint.check_cancelled(cancel)
+            existing_id = db.find(paper['identifiers'])
+            if existing_id:
+                print(f"\n论文已存在数据库中({existing_id})，跳过: {paper['title']}")
+                update_download_info(readme_path, paper, i, "已存在")
+                counts["skip"] += 1
+            elif claims is not None and not claims.claim(paper['identifiers']):
+                print(f"\n论文已由其他任务下载，跳过: {paper['title']}")
+                update_download_info(readme_path, paper, i, "其他任务已下载")
+                counts["skip"] += 1
+            else:
+                download_one(paper, i, session_dir, readme_path, db, manifest, retries, counts)
+            state["next_index"] = i + 1
+            checkpoint.save()
+        
+        # 添加下载统计信息
+        with open(readme_path, 'a', encoding='utf-8') as f:
+            f.write(f"\n## 下载统计\n\n")
+            f.write(f"- 总论文数: {len(papers)}\n")
+            f.write(f"- 成功下载: {counts['success']}\n")
+            f.write(f"- 已存在跳过: {counts['skip']}\n")
+            f.write(f"- 下载失败: {counts['fail']}\n")
+        
+        if counts["fail"]:
+            print(f"\n{counts['fail']} 篇论文下载失败，已加入重试队列（python retry_queue.py drain）")
+        completed = True
+    finally:
+        if completed:
+            checkpoint.remove()
         else:
-            update_download_info(readme_path, paper, i, "失败")
-            fail_count += 1
-            print(f"\n下载失败: {title}")
+            checkpoint.save(force=True)
+            print(f"\n任务进度已保存，可运行 python open_papers_downloader.py --resume \"{checkpoint.path}\" 继续")
+        retries.save()
+        manifest.save()
+        if own_db:
+            db.close()
+
+def download_one(paper: Dict, index: int, session_dir: str, readme_path: str,
+                 db, manifest, retries, counts: Dict):
+    """下载一篇论文，更新说明文件、数据库、文件清单和重试队列"""
+    title = paper['title']
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    filename = f"{index:02d}-{safe_title[:100]}.pdf"
+    filepath = os.path.join(session_dir, filename)
     
-    # 添加下载统计信息
-    with open(readme_path, 'a', encoding='utf-8') as f:
-        f.write(f"\n## 下载统计\n\n")
-        f.write(f"- 总论文数: {len(papers)}\n")
-        f.write(f"- 成功下载: {success_count}\n")
-        f.write(f"- 已存在跳过: {skip_count}\n")
-        f.write(f"- 下载失败: {fail_count}\n")
+    record = {
+        "title": paper['title'],
+        "authors": paper['authors'],
+        "year": paper['year'],
+        "citations": paper['citations'],
+        "abstract": paper.get('abstract'),
+        "venue": paper.get('venue'),
+        "doi": paper['external_ids'].get('DOI'),
+        "arxiv_id": paper['external_ids'].get('ArXiv'),
+        "identifiers": paper['identifiers'],
+        "filename": filename,
+        "sha256": None,
+        "downloaded_date": datetime.now().strftime("%Y-%m-%d"),
+        "source": "semantic_scholar"
+    }
+    
+    error = download_paper(paper['pdf_url'], filepath)
+    if error is None:
+        update_download_info(readme_path, paper, index, "成功")
+        counts["success"] += 1
+        # 放入内容存储，会话目录中只保留链接
+        record["sha256"] = pdf_store.try_ingest(filepath)
+        
+        # 更新数据库
+        save_paper_database(db, paper['source_id'], record)
+        manifest.record(paper['source_id'], filepath)
+        retries.resolve(paper['source_id'])
+        
+        print(f"\n成功下载: {title}")
+    else:
+        update_download_info(readme_path, paper, index, "失败")
+        counts["fail"] += 1
+        # 记入重试队列，重试成功后再写入数据库
+        retries.fail(paper['source_id'], paper['pdf_url'], filepath, record, error, "semantic_scholar")
+        print(f"\n下载失败: {title}")
+
+def resume_download(resume_path: Optional[str] = None, download_dir: str = "semantic_scholar_papers"):
+    """
+    继续被中断的下载任务
+    
+    参数:
+        resume_path: 检查点文件或会话目录，为None时使用下载目录中最近一次未完成的任务
+    """
+    checkpoint = job_checkpoint.Checkpoint.load(job_checkpoint.resolve_resume_path(resume_path, download_dir),
+                                                "semantic_scholar")
+    download_papers(checkpoint.criteria(SearchCriteria), download_dir,
+                    checkpoint.state.get("db_path", "papers_db.json"), confirm=False, checkpoint=checkpoint)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic Scholar论文下载工具")
+    parser.add_argument("--resume", nargs="?", const="", default=None, metavar="CHECKPOINT",
+                        help="继续中断的下载任务，可指定检查点文件或会话目录（默认为最近一次）")
+    args = parser.parse_args()
     try:
-        interactive_search()
+        if args.resume is not None:
+            resume_download(args.resume or None)
+        else:
+            interactive_search()
     except KeyboardInterrupt:
         print("\n\n程序已被用户中断")
     except Exception as e:
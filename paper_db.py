@@ -0,0 +1,408 @@
+"""
+论文数据库存储层
+
+下载器和check_papers通过open_paper_store访问论文记录，不再直接读写papers_db.json。
+支持两种存储：
+- JSON：快照文件与原来的papers_db.json格式相同，新记录追加到旁边的.journal日志，
+  达到阈值时合并成新快照（临时文件+fsync+重命名），写入中途崩溃不会损坏整个库
+- SQLite：按主键单行写入，保存一篇论文的开销与库大小无关
+
+两种存储都维护一个身份索引（见paper_identity），把arXiv ID、Semantic Scholar paperId、
+DOI和标题映射到记录的paper_id，find()可以找到从另一个来源下载过的同一篇论文。
+
+数据库路径以.sqlite/.db结尾时使用SQLite。路径为JSON文件但旁边存在同名的.sqlite文件时
+（即已经用 `python paper_db.py import papers_db.json` 导入过），自动改用SQLite。
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import paper_identity
+from file_lock import FileLock
+
+SQLITE_EXTENSIONS = (".sqlite", ".db")
+JOURNAL_SUFFIX = ".journal"     # JSON数据库的追加日志后缀
+LOCK_SUFFIX = ".lock"           # JSON数据库的跨进程锁文件后缀
+COMPACT_THRESHOLD = 1000        # 日志达到多少条时合并到快照
+
+class PaperStore:
+    """论文记录存储的公共接口，记录以paper_id为键"""
+
+    def __contains__(self, paper_id: str) -> bool:
+        return self.get(paper_id) is not None
+
+    def get(self, paper_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def find(self, keys: Iterable[str]) -> Optional[str]:
+        """
+        按身份键查找已有的论文
+
+        参数:
+            keys: paper_identity生成的身份键
+        返回:
+            第一个命中的记录的paper_id，都不存在时返回None
+        """
+        raise NotImplementedError
+
+    def put(self, paper_id: str, record: Dict):
+        """新增或更新一条记录并立即持久化"""
+        raise NotImplementedError
+
+    def delete_many(self, paper_ids: Iterable[str]) -> int:
+        """删除多条记录，返回实际删除的数量"""
+        raise NotImplementedError
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+def write_json_atomic(path: str, data: Dict, indent: Optional[int] = 2):
+    """通过临时文件+fsync+重命名写入JSON，任何时刻磁盘上都是完整的旧文件或新文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # 重命名本身也需要落盘
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """文件的(inode, 修改时间, 大小)，用来判断其他进程是否改写了文件"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+class JsonPaperStore(PaperStore):
+    """
+    JSON快照+追加日志
+
+    每条新增或删除只向日志追加一行，加载时先读快照再重放日志，
+    日志条数达到compact_threshold时合并为新快照。
+
+    所有读写都持有数据库旁边的.lock文件锁，并先追上其他进程追加的日志或合并出的新快照，
+    因此多个下载任务可以同时使用同一个库，互相看到对方新增的论文，不会覆盖彼此的写入。
+    """
+
+    def __init__(self, db_path: str, compact_threshold: int = COMPACT_THRESHOLD):
+        self.db_path = db_path
+        self.journal_path = db_path + JOURNAL_SUFFIX
+        self.compact_threshold = compact_threshold
+        self._lock = FileLock(db_path + LOCK_SUFFIX)
+        self._snapshot_signature = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._written = False
+        self.data = {"papers": {}}
+        self._identity = {}
+        with self._lock:
+            self._refresh_locked()
+
+    def _load_snapshot_locked(self):
+        if os.path.exists(self.db_path):
+            with open(self.db_path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"papers": {}}
+        self._identity = {}
+        for paper_id, record in self.data["papers"].items():
+            self._index_record(paper_id, record)
+        self._snapshot_signature = _file_signature(self.db_path)
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def _refresh_locked(self):
+        """重新读取其他进程改写的快照，并重放新追加的日志"""
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if _file_signature(self.db_path) != self._snapshot_signature or journal_size < self._journal_offset:
+            self._load_snapshot_locked()
+        if journal_size > self._journal_offset:
+            torn = self._replay_journal_locked()
+            # 持有锁时日志末尾仍有不完整的行，说明写入进程中途崩溃；立即合并，
+            # 避免之后追加的记录接在残行后面
+            if torn:
+                self._compact_locked()
+
+    def _replay_journal_locked(self) -> bool:
+        """
+        从上次读到的位置开始把日志中的操作应用到内存数据
+
+        返回:
+            是否遇到不完整的行
+        """
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self._journal_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    return True
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    return True
+                if entry.get("op") == "put":
+                    self._set_record(entry["id"], entry["record"])
+                elif entry.get("op") == "delete":
+                    self._remove_record(entry["id"])
+                self._journal_offset += len(line)
+                self._journal_entries += 1
+        return False
+
+    def _index_record(self, paper_id: str, record: Dict):
+        for key in paper_identity.record_keys(paper_id, record):
+            self._identity.setdefault(key, paper_id)
+
+    def _set_record(self, paper_id: str, record: Dict):
+        self._remove_record(paper_id)
+        self.data["papers"][paper_id] = record
+        self._index_record(paper_id, record)
+
+    def _remove_record(self, paper_id: str) -> bool:
+        """从内存数据和身份索引中删除一条记录，返回记录是否存在"""
+        record = self.data["papers"].pop(paper_id, None)
+        if record is None:
+            return False
+        for key in paper_identity.record_keys(paper_id, record):
+            if self._identity.get(key) == paper_id:
+                del self._identity[key]
+        return True
+
+    def get(self, paper_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh_locked()
+            return self.data["papers"].get(paper_id)
+
+    def find(self, keys: Iterable[str]) -> Optional[str]:
+        with self._lock:
+            self._refresh_locked()
+            for key in keys:
+                if key in self._identity:
+                    return self._identity[key]
+            return None
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            self._refresh_locked()
+            return paper_id in self.data["papers"]
+
+    def _append_locked(self, entries: List[Dict]):
+        """向日志追加若干条操作并落盘，达到阈值时合并快照"""
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries).encode('utf-8')
+        with open(self.journal_path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_offset += len(data)
+        self._journal_entries += len(entries)
+        self._written = True
+        if self._journal_entries >= self.compact_threshold:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        write_json_atomic(self.db_path, self.data)
+        # 快照已包含日志中的全部操作；即使删除日志前崩溃，重放也是幂等的
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._snapshot_signature = _file_signature(self.db_path)
+        self._journal_offset = 0
+        self._journal_entries = 0
+
+    def compact(self):
+        """把日志合并到新的快照"""
+        with self._lock:
+            self._refresh_locked()
+            self._compact_locked()
+
+    def put(self, paper_id: str, record: Dict):
+        # 读-改-写都在锁内完成：先合并其他进程的写入，再追加自己的一条
+        with self._lock:
+            self._refresh_locked()
+            self._set_record(paper_id, record)
+            self._append_locked([{"op": "put", "id": paper_id, "record": record}])
+
+    def delete_many(self, paper_ids: Iterable[str]) -> int:
+        with self._lock:
+            self._refresh_locked()
+            removed = [paper_id for paper_id in paper_ids if self._remove_record(paper_id)]
+            if removed:
+                self._append_locked([{"op": "delete", "id": paper_id} for paper_id in removed])
+            return len(removed)
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            self._refresh_locked()
+            return iter(list(self.data["papers"].items()))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh_locked()
+            return len(self.data["papers"])
+
+    def close(self):
+        """关闭时合并日志，让快照文件保持完整"""
+        if self._written:
+            self.compact()
+
+class SqlitePaperStore(PaperStore):
+    """
+    SQLite存储，以paper_id为主键，每次写入只影响一行
+
+    使用WAL模式和忙等待超时，多个进程可以同时读写同一个数据库文件
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    paper_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    filename TEXT,
+                    record TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_papers_filename ON papers(filename)")
+            has_identities = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'identities'").fetchone()
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS identities (
+                    key TEXT PRIMARY KEY,
+                    paper_id TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_identities_paper ON identities(paper_id)")
+            # 旧版本创建的数据库没有身份索引，首次打开时补建
+            if not has_identities:
+                rows = self._conn.execute("SELECT paper_id, record FROM papers").fetchall()
+                self._index_locked((paper_id, json.loads(record)) for paper_id, record in rows)
+
+    def _index_locked(self, records: Iterable[Tuple[str, Dict]]):
+        rows = [(key, paper_id) for paper_id, record in records
+                for key in paper_identity.record_keys(paper_id, record)]
+        self._conn.executemany("INSERT OR IGNORE INTO identities (key, paper_id) VALUES (?, ?)", rows)
+
+    def get(self, paper_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __contains__(self, paper_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM papers WHERE paper_id = ?", (paper_id,)).fetchone()
+        return row is not None
+
+    def find(self, keys: Iterable[str]) -> Optional[str]:
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT paper_id FROM identities WHERE key = ?", (key,)).fetchone()
+                if row:
+                    return row[0]
+        return None
+
+    def put(self, paper_id: str, record: Dict):
+        self.put_many([(paper_id, record)])
+
+    def put_many(self, records: Iterable[Tuple[str, Dict]]):
+        """在一个事务中写入多条记录"""
+        records = list(records)
+        rows = [
+            (paper_id, record.get("title"), record.get("filename"), json.dumps(record, ensure_ascii=False))
+            for paper_id, record in records
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO papers (paper_id, title, filename, record) VALUES (?, ?, ?, ?)
+                ON CONFLICT(paper_id) DO UPDATE SET
+                    title = excluded.title, filename = excluded.filename, record = excluded.record
+            """, rows)
+            self._conn.executemany("DELETE FROM identities WHERE paper_id = ?",
+                                   [(paper_id,) for paper_id, _ in records])
+            self._index_locked(records)
+
+    def delete_many(self, paper_ids: Iterable[str]) -> int:
+        paper_ids = [(paper_id,) for paper_id in paper_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM identities WHERE paper_id = ?", paper_ids)
+            cursor = self._conn.executemany("DELETE FROM papers WHERE paper_id = ?", paper_ids)
+            return cursor.rowcount
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        with self._lock:
+            rows = self._conn.execute("SELECT paper_id, record FROM papers").fetchall()
+        return ((paper_id, json.loads(record)) for paper_id, record in rows)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def sqlite_path_for(json_path: str) -> str:
+    """JSON数据库对应的SQLite文件路径"""
+    return os.path.splitext(json_path)[0] + ".sqlite"
+
+def resolve_db_path(db_path: str) -> str:
+    """返回实际使用的数据库文件路径（已导入SQLite时返回SQLite文件）"""
+    if db_path.lower().endswith(".json") and os.path.exists(sqlite_path_for(db_path)):
+        return sqlite_path_for(db_path)
+    return db_path
+
+def database_exists(db_path: str) -> bool:
+    """数据库文件是否存在"""
+    return os.path.exists(resolve_db_path(db_path))
+
+def open_paper_store(db_path: str) -> PaperStore:
+    """按路径打开论文数据库"""
+    path = resolve_db_path(db_path)
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqlitePaperStore(path)
+    return JsonPaperStore(path)
+
+def import_json_database(json_path: str, sqlite_path: Optional[str] = None) -> int:
+    """
+    把现有的JSON数据库一次性导入SQLite
+
+    返回:
+        导入的论文数量
+    """
+    sqlite_path = sqlite_path or sqlite_path_for(json_path)
+    # 通过JsonPaperStore读取，包含尚未合并的日志
+    source = JsonPaperStore(json_path)
+    store = SqlitePaperStore(sqlite_path)
+    try:
+        store.put_many(source.items())
+        return len(store)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="论文数据库工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="把JSON数据库导入SQLite")
+    import_parser.add_argument("json_path", nargs="?", default="papers_db.json")
+    import_parser.add_argument("sqlite_path", nargs="?", default=None)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_json_database(args.json_path, args.sqlite_path)
+        print(f"已导入 {count} 篇论文到 {args.sqlite_path or sqlite_path_for(args.json_path)}")
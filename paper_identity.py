@@ -0,0 +1,92 @@
+"""
+跨来源的论文身份标识
+
+arXiv下载器以arXiv ID为数据库键，Semantic Scholar下载器以paperId为键，同一篇论文
+从两个来源下载时键不同。这里把一篇论文的各种标识统一成身份键：
+arXiv ID（去掉版本号）、Semantic Scholar paperId、DOI和规范化标题，
+数据库按这些键建立二级索引，下载前用来判断论文是否已经存在。
+
+身份键与citation_cache的缓存键格式相同（arxiv:、s2:、doi:、title:前缀）。
+"""
+import re
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from citation_cache import arxiv_key, normalize_title, s2_id_from_url, s2_key, title_key
+
+# 新版(2301.01234)和旧版(hep-th/9901001)arXiv ID，可带版本号
+ARXIV_ID_PATTERN = re.compile(r'^(\d{4}\.\d{4,5}|[a-z\-]+(\.[A-Z]{2})?/\d{7})(v\d+)?$')
+
+def doi_key(doi: str) -> str:
+    """DOI对应的身份键（DOI不区分大小写）"""
+    doi = re.sub(r'^(https?://(dx\.)?doi\.org/|doi:)', '', doi.strip(), flags=re.IGNORECASE)
+    return "doi:" + doi.lower()
+
+def is_arxiv_id(paper_id: str) -> bool:
+    """是否为arXiv ID"""
+    return bool(ARXIV_ID_PATTERN.match(paper_id or ''))
+
+def _unique(keys: Iterable[Optional[str]]) -> List[str]:
+    result = []
+    for key in keys:
+        if key and key not in result:
+            result.append(key)
+    return result
+
+def build_keys(arxiv_id: Optional[str] = None, s2_id: Optional[str] = None,
+               doi: Optional[str] = None, title: Optional[str] = None) -> List[str]:
+    """由已知的各种标识生成身份键列表，缺少的标识跳过"""
+    return _unique([
+        arxiv_key(arxiv_id) if arxiv_id else None,
+        s2_key(s2_id) if s2_id else None,
+        doi_key(doi) if doi else None,
+        title_key(title) if title and normalize_title(title) else None
+    ])
+
+def keys_from_external_ids(paper_id: Optional[str], external_ids: Optional[Dict],
+                           title: Optional[str] = None) -> List[str]:
+    """
+    由Semantic Scholar论文的paperId和externalIds生成身份键
+
+    参数:
+        paper_id: Semantic Scholar paperId
+        external_ids: 接口返回的externalIds，如 {"ArXiv": "2301.01234", "DOI": "10.1/abc"}
+        title: 论文标题
+    """
+    external_ids = external_ids or {}
+    return build_keys(external_ids.get("ArXiv"), paper_id, external_ids.get("DOI"), title)
+
+def record_keys(paper_id: str, record: Dict) -> List[str]:
+    """
+    数据库中一条记录的全部身份键
+
+    新记录保存了identifiers字段；旧记录只能从数据库键、Semantic Scholar链接和标题推断
+    """
+    inferred = build_keys(
+        arxiv_id=paper_id if is_arxiv_id(paper_id) else None,
+        s2_id=None if is_arxiv_id(paper_id) else paper_id,
+        title=record.get("title")
+    )
+    s2_id = s2_id_from_url(record.get("semantic_scholar_url"))
+    return _unique(list(record.get("identifiers") or []) + inferred + [s2_key(s2_id) if s2_id else None])
+
+class IdentityClaims:
+    """
+    同一进程中多个下载任务之间的去重
+
+    任务开始下载一篇论文前认领它的身份键，任意一个键已被其他任务认领的论文不再下载。
+    数据库只在下载完成后才有记录，认领用来避免几个任务同时下载同一篇论文。
+    """
+
+    def __init__(self):
+        self._keys = set()
+        self._lock = threading.Lock()
+
+    def claim(self, keys: Iterable[str]) -> bool:
+        """认领论文，已被认领时返回False"""
+        keys = [key for key in keys if key]
+        with self._lock:
+            if any(key in self._keys for key in keys):
+                return False
+            self._keys.update(keys)
+            return True
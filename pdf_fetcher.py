@@ -0,0 +1,226 @@
+"""
+流式PDF下载
+
+按块写入临时的.part文件，首块即校验PDF魔数，下载完整后原子重命名为目标文件，
+内存占用与PDF大小无关，中断的下载也不会留下看似完整的PDF。
+
+未完成的下载按URL保存在PARTIAL_DIR中，并记录服务器返回的ETag/Last-Modified。
+重试或重新运行程序时用Range请求从断点续传，服务器不支持时自动回退为完整下载。
+"""
+import errno
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from typing import Optional
+
+import requests
+
+import http_client
+from file_lock import FileLock
+
+CHUNK_SIZE = 64 * 1024             # 每次写入的块大小
+PART_SUFFIX = ".part"              # 未完成下载的临时文件后缀
+META_SUFFIX = ".part.json"         # 断点续传校验信息文件后缀
+LOCK_SUFFIX = ".part.lock"         # 下载锁文件后缀，防止多个进程写同一个临时文件
+PARTIAL_DIR = "partial_downloads"  # 未完成下载的存放目录
+PDF_MAGIC = b"%PDF"
+
+_url_locks = {}
+_url_locks_lock = threading.Lock()
+
+class NotPdfError(Exception):
+    """响应内容不是PDF"""
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """下载的字节数少于预期，视为网络错误以便重试"""
+
+class DownloadCancelled(Exception):
+    """下载被调用方取消（如多个来源竞速时其他来源已经成功）"""
+
+def partial_paths(url: str) -> tuple:
+    """
+    返回URL对应的临时文件路径
+
+    返回:
+        tuple: (.part文件路径, 校验信息文件路径)
+    """
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    base = os.path.join(PARTIAL_DIR, key)
+    return base + PART_SUFFIX, base + META_SUFFIX
+
+def _url_lock(url: str) -> FileLock:
+    """同一URL同一时间只允许一个线程（包括其他进程中的线程）写入临时文件"""
+    with _url_locks_lock:
+        if url not in _url_locks:
+            part_path, _ = partial_paths(url)
+            lock_path = part_path[:-len(PART_SUFFIX)] + LOCK_SUFFIX
+            _url_locks[url] = FileLock(lock_path, remove_on_release=True)
+        return _url_locks[url]
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def discard_partial(url: str):
+    """删除URL对应的未完成下载"""
+    for path in partial_paths(url):
+        _remove_quietly(path)
+
+def _load_resume_point(url: str) -> tuple:
+    """
+    读取断点信息
+
+    返回:
+        tuple: (已下载字节数, If-Range校验值)，无法续传时为(0, None)
+    """
+    part_path, meta_path = partial_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        size = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        discard_partial(url)
+        return 0, None
+
+    validator = meta.get("etag") or meta.get("last_modified")
+    if meta.get("url") != url or not validator or size <= 0:
+        discard_partial(url)
+        return 0, None
+    return size, validator
+
+def _save_validators(url: str, response: requests.Response):
+    """记录服务器返回的ETag/Last-Modified，供之后续传使用"""
+    etag = response.headers.get('etag')
+    last_modified = response.headers.get('last-modified')
+    # 弱ETag不能用于Range请求
+    if etag and etag.startswith('W/'):
+        etag = None
+    _, meta_path = partial_paths(url)
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump({"url": url, "etag": etag, "last_modified": last_modified}, f)
+    return etag or last_modified
+
+def _content_range(response: requests.Response) -> tuple:
+    """解析Content-Range，返回(起始字节, 总字节数)，无法解析时返回(None, None)"""
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('content-range', ''))
+    if not match:
+        return None, None
+    total = match.group(2)
+    return int(match.group(1)), int(total) if total.isdigit() else None
+
+def _read_head(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read(len(PDF_MAGIC))
+
+def _finalize(part_path: str, filepath: str):
+    """将完成的临时文件移动到目标位置（同一文件系统上为原子重命名）"""
+    try:
+        os.replace(part_path, filepath)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 跨文件系统时先复制到目标目录再原子重命名
+        tmp_path = f"{filepath}.{os.getpid()}{PART_SUFFIX}"
+        shutil.copyfile(part_path, tmp_path)
+        os.replace(tmp_path, filepath)
+        os.remove(part_path)
+
+def stream_pdf(url: str, filepath: str, require_content_type: bool = True,
+               chunk_size: int = CHUNK_SIZE, resume: bool = True,
+               cancel_event: Optional[threading.Event] = None, **kwargs) -> int:
+    """
+    流式下载PDF并原子写入filepath，支持断点续传
+
+    参数:
+        url: PDF地址
+        filepath: 目标文件路径
+        require_content_type: 是否要求Content-Type为application/pdf
+        chunk_size: 每次读取的块大小
+        resume: 是否尝试从已有的未完成下载续传
+        cancel_event: 设置后在下一个数据块处中止下载（未完成部分按续传规则保留）
+        kwargs: 传给http_client.get的其他参数
+    返回:
+        本次请求写入的字节数
+    异常:
+        NotPdfError: Content-Type或文件头不是PDF
+        DownloadCancelled: cancel_event被设置
+        requests.exceptions.RequestException: 网络错误或下载不完整（未完成部分会保留以便续传）
+    """
+    os.makedirs(PARTIAL_DIR, exist_ok=True)
+    part_path, meta_path = partial_paths(url)
+
+    with _url_lock(url):
+        offset, validator = _load_resume_point(url) if resume else (0, None)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        # 压缩传输会使字节偏移失效，PDF本身已压缩，直接请求原始内容
+        headers['Accept-Encoding'] = 'identity'
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            headers['If-Range'] = validator
+
+        with http_client.get(url, stream=True, headers=headers, **kwargs) as response:
+            if response.status_code == 416:
+                discard_partial(url)
+                raise IncompleteDownloadError("断点位置无效，将重新下载", response=response)
+            response.raise_for_status()
+
+            content_type = response.headers.get('content-type', '').lower()
+            if require_content_type and 'application/pdf' not in content_type:
+                discard_partial(url)
+                raise NotPdfError(f"下载的文件不是PDF格式 (Content-Type: {content_type})")
+
+            range_start, total = _content_range(response)
+            if offset and response.status_code == 206 and range_start == offset:
+                mode = 'ab'
+                head = _read_head(part_path)
+            else:
+                # 服务器不支持Range或文件已变化，从头下载
+                offset = 0
+                mode = 'wb'
+                head = b""
+                length = response.headers.get('content-length')
+                total = int(length) if length and length.isdigit() else None
+                validator = _save_validators(url, response)
+
+            written = 0
+            try:
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise DownloadCancelled(url)
+                        # 在写入前校验文件头，不是PDF则尽早中止
+                        if len(head) < len(PDF_MAGIC):
+                            head += chunk[:len(PDF_MAGIC) - len(head)]
+                            if len(head) >= len(PDF_MAGIC) and not head.startswith(PDF_MAGIC):
+                                raise NotPdfError("下载的文件不是有效的PDF格式")
+                        f.write(chunk)
+                        written += len(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                if not head.startswith(PDF_MAGIC):
+                    raise NotPdfError("下载的文件不是有效的PDF格式")
+
+                # 核对总长度，防止连接提前关闭导致的截断
+                if total is not None and offset + written < total:
+                    raise IncompleteDownloadError(f"下载不完整: {offset + written}/{total} 字节")
+
+                _finalize(part_path, filepath)
+                _remove_quietly(meta_path)
+            except NotPdfError:
+                discard_partial(url)
+                raise
+            except BaseException:
+                # 没有校验值时无法安全续传
+                if not validator:
+                    discard_partial(url)
+                raise
+    return written
@@ -0,0 +1,119 @@
+"""
+按内容寻址的PDF存储
+
+每个PDF按SHA-256只保存一份，存放在 pdf_store/ab/cd/<sha256>.pdf 这样的两级分片目录中，
+避免单个目录下文件过多。下载会话目录中的文件是指向存储对象的硬链接
+（跨文件系统等无法硬链接时依次退回符号链接、复制），
+同一篇论文出现在多个主题会话中、或从不同链接下载到相同内容时只占用一份磁盘空间。
+
+数据库记录中保存文件的sha256，检查完整性只需比较哈希，丢失的会话文件可以直接从存储恢复。
+"""
+import hashlib
+import os
+import shutil
+import threading
+from typing import Optional
+
+STORE_DIR = "pdf_store"     # 存储目录
+LINK_MODE = "hardlink"      # 会话目录中的文件形式：hardlink、symlink或copy
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(filepath: str) -> str:
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def object_path(sha256: str, store_dir: str = STORE_DIR) -> str:
+    """哈希对应的存储对象路径"""
+    return os.path.join(store_dir, sha256[:2], sha256[2:4], sha256 + ".pdf")
+
+def _tmp_path(path: str) -> str:
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _same_file(a: str, b: str) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
+
+def link_object(target: str, filepath: str, link_mode: str = LINK_MODE):
+    """
+    让filepath指向存储对象target，通过临时文件+重命名原子替换
+
+    硬链接失败时退回符号链接，符号链接失败时退回复制
+    """
+    if _same_file(target, filepath):
+        return
+    tmp_path = _tmp_path(filepath)
+    try:
+        if link_mode == "hardlink":
+            try:
+                os.link(target, tmp_path)
+            except OSError:
+                link_mode = "symlink"
+        if link_mode == "symlink":
+            try:
+                os.symlink(os.path.relpath(os.path.abspath(target), os.path.dirname(os.path.abspath(filepath))),
+                           tmp_path)
+            except (OSError, NotImplementedError):
+                link_mode = "copy"
+        if link_mode == "copy":
+            shutil.copyfile(target, tmp_path)
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+
+def ingest(filepath: str, store_dir: str = STORE_DIR, link_mode: str = LINK_MODE) -> str:
+    """
+    把刚下载的文件放入存储，并把原位置换成指向存储对象的链接
+
+    存储中已有相同内容时直接复用已有对象，新下载的副本被链接替换。
+
+    返回:
+        文件的sha256
+    """
+    sha256 = file_sha256(filepath)
+    target = object_path(sha256, store_dir)
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = _tmp_path(target)
+        try:
+            try:
+                os.link(filepath, tmp_path)
+            except OSError:
+                shutil.copyfile(filepath, tmp_path)
+            # 多个进程同时放入相同内容时，重命名覆盖的也是相同的字节
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+    link_object(target, filepath, link_mode)
+    return sha256
+
+def restore(sha256: str, filepath: str, store_dir: str = STORE_DIR, link_mode: str = LINK_MODE) -> bool:
+    """
+    从存储恢复文件
+
+    存储对象的哈希与记录不符（对象已损坏）时删除该对象并返回False
+    """
+    target = object_path(sha256, store_dir)
+    if not os.path.exists(target):
+        return False
+    if file_sha256(target) != sha256:
+        os.remove(target)
+        return False
+    os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+    link_object(target, filepath, link_mode)
+    return True
+
+def try_ingest(filepath: str) -> Optional[str]:
+    """放入存储，失败时保留原文件并返回None"""
+    try:
+        return ingest(filepath)
+    except OSError as e:
+        print(f"\n放入PDF存储失败 {filepath}: {str(e)}")
+        return None
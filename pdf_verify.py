@@ -0,0 +1,139 @@
+"""
+PDF结构完整性检查
+
+只检查文件头的%PDF无法发现下载中断造成的截断文件。这里检查PDF的结构：
+- 基本检查：文件头%PDF、文件末尾的%%EOF，以及startxref指向的交叉引用表位置有效
+- 深度检查：另外解析传统交叉引用表，确认其中每个对象的偏移处确实是对应的对象
+
+检查在进程池中并行进行，结果保存在文件清单中，文件的大小和修改时间不变时不会重复检查。
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from file_manifest import FileManifest
+
+TAIL_SIZE = 4096            # 在文件末尾多少字节内查找%%EOF和startxref
+MIN_PDF_SIZE = 64           # 小于该大小的文件不可能是完整的PDF
+VERIFY_CHUNKSIZE = 16       # 每次交给工作进程的文件数
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)\s+%%EOF', re.S)
+_OBJECT_HEADER = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj\b')
+_XREF_SECTION = re.compile(rb'(\d+)\s+(\d+)\s*[\r\n]+')
+_XREF_ENTRY = re.compile(rb'(\d{10})\s(\d{5})\s([nf])\s*')
+
+def _check_xref_table(f, offset: int, size: int) -> Optional[str]:
+    """检查传统交叉引用表中的对象偏移，返回错误原因，没有问题时返回None"""
+    f.seek(offset)
+    data = f.read(min(size - offset, 64 * 1024 * 1024))
+    pos = 4  # 跳过"xref"
+    while True:
+        while pos < len(data) and data[pos:pos + 1].isspace():
+            pos += 1
+        if data.startswith(b"trailer", pos) or pos >= len(data):
+            return None
+        match = _XREF_SECTION.match(data, pos)
+        if not match:
+            return "交叉引用表格式错误"
+        first, count = int(match.group(1)), int(match.group(2))
+        pos = match.end()
+        for number in range(first, first + count):
+            entry = _XREF_ENTRY.match(data, pos)
+            if not entry:
+                return "交叉引用表不完整"
+            pos = entry.end()
+            if entry.group(3) != b"n":
+                continue
+            obj_offset = int(entry.group(1))
+            if obj_offset >= size:
+                return f"对象{number}的偏移超出文件大小"
+            f.seek(obj_offset)
+            header = _OBJECT_HEADER.match(f.read(32))
+            if not header or int(header.group(1)) != number:
+                return f"对象{number}的偏移无效"
+
+def check_pdf(filepath: str, deep: bool = False) -> Tuple[bool, str]:
+    """
+    检查PDF文件结构
+
+    参数:
+        filepath: PDF文件路径
+        deep: 是否逐个检查交叉引用表中的对象
+    返回:
+        tuple: (是否完整, 原因说明)
+    """
+    try:
+        size = os.path.getsize(filepath)
+        if size < MIN_PDF_SIZE:
+            return False, "文件过小"
+        with open(filepath, 'rb') as f:
+            if not f.read(5).startswith(b"%PDF"):
+                return False, "不是PDF文件"
+            f.seek(max(0, size - TAIL_SIZE))
+            tail = f.read()
+            if b"%%EOF" not in tail:
+                return False, "缺少%%EOF，文件可能被截断"
+            matches = list(_STARTXREF.finditer(tail))
+            if not matches:
+                return False, "缺少startxref"
+            offset = int(matches[-1].group(1))
+            if offset <= 0 or offset >= size:
+                return False, "startxref偏移超出文件范围"
+            # startxref应指向传统交叉引用表(xref)或交叉引用流对象
+            f.seek(offset)
+            head = f.read(32)
+            if head.lstrip().startswith(b"xref"):
+                if deep:
+                    error = _check_xref_table(f, offset, size)
+                    if error:
+                        return False, error
+            elif not _OBJECT_HEADER.match(head):
+                return False, "startxref未指向交叉引用表"
+        return True, "完整"
+    except (OSError, ValueError) as e:
+        return False, f"读取失败: {e}"
+
+def _check_task(args: Tuple[str, bool]) -> Tuple[bool, str]:
+    return check_pdf(*args)
+
+def verify_files(manifest: FileManifest, relpaths: List[str], deep: bool = False,
+                 workers: Optional[int] = None) -> Dict[str, Tuple[bool, str]]:
+    """
+    并行检查清单中的PDF文件，结果记入清单
+
+    文件的大小和修改时间与上次检查时相同、且上次检查的深度足够时直接使用记录的结果。
+
+    参数:
+        manifest: 文件清单（需要先scan）
+        relpaths: 要检查的文件的相对路径
+        deep: 是否深度检查
+        workers: 进程数，默认为CPU核数
+    返回:
+        {相对路径: (是否完整, 原因说明)}
+    """
+    results = {}
+    pending = []
+    for relpath in relpaths:
+        try:
+            st = os.stat(manifest.abspath(relpath))
+        except OSError:
+            results[relpath] = (False, "文件不存在")
+            continue
+        info = manifest.file_info(relpath) or {}
+        check = info.get("check")
+        # 目录未变化时清单不会重新stat文件，这里按实际的大小和修改时间判断缓存是否有效
+        if (check and info.get("size") == st.st_size and info.get("mtime_ns") == st.st_mtime_ns
+                and (check["deep"] or not deep)):
+            results[relpath] = (check["ok"], check["reason"])
+        else:
+            pending.append((relpath, st))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            checked = executor.map(_check_task, [(manifest.abspath(relpath), deep) for relpath, _ in pending],
+                                   chunksize=VERIFY_CHUNKSIZE)
+            for (relpath, st), (ok, reason) in zip(pending, checked):
+                results[relpath] = (ok, reason)
+                manifest.update_file(relpath, st, check={"ok": ok, "reason": reason, "deep": deep})
+    return results
@@ -0,0 +1,101 @@
+"""
+进程内共享的API限速器
+
+每个API主机一个令牌桶，所有调用方共用。收到429时按AIMD策略调整速率：
+成功请求线性提高速率，被限流时速率减半，并遵守服务器给出的Retry-After。
+"""
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """自适应速率的令牌桶"""
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = 0.1,
+                 max_rate: Optional[float] = None, increase: float = 0.05, decrease: float = 0.5):
+        """
+        参数:
+            rate: 初始速率（请求/秒）
+            capacity: 桶容量，即允许的突发请求数
+            min_rate: 速率下限
+            max_rate: 速率上限，默认为初始速率
+            increase: 每次成功请求增加的速率（加性增）
+            decrease: 被限流时速率乘以的系数（乘性减）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.increase = increase
+        self.decrease = decrease
+        self.stats = {"requests": 0, "throttled": 0, "waited": 0.0}
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.stats["requests"] += 1
+                    return
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+                self.stats["waited"] += wait
+            time.sleep(wait)
+
+    def on_success(self):
+        """请求成功，线性提高速率"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """收到429，速率减半并暂停到Retry-After之后"""
+        with self._lock:
+            now = time.monotonic()
+            self.stats["throttled"] += 1
+            # 并发请求同时收到的429只算一次，避免速率被连续减半
+            if now - self._last_decrease >= 1 / self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._last_decrease = now
+            self._tokens = 0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """带随机抖动的指数退避时间，避免多个线程同时重试"""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析Retry-After头（只支持秒数形式）"""
+    if value and value.strip().isdigit():
+        return float(value.strip())
+    return None
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+def configure_host(host: str, rate: float, **kwargs) -> TokenBucket:
+    """为主机设置限速器，参数同TokenBucket"""
+    limiter = TokenBucket(rate, **kwargs)
+    with _limiters_lock:
+        _limiters[host.lower()] = limiter
+    return limiter
+
+def get_limiter(url: str) -> Optional[TokenBucket]:
+    """返回URL所属主机的限速器，未配置限速的主机返回None"""
+    host = urlparse(url).netloc.lower()
+    with _limiters_lock:
+        return _limiters.get(host)
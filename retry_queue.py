@@ -0,0 +1,285 @@
+"""
+下载失败重试队列
+
+下载器中下载失败的论文会记入数据库旁边的 *.retry.json，而不是只打印一行错误：
+每条记录保存下载地址、目标文件、下载成功后要写入数据库的记录、错误类型、
+已尝试次数和下次可以重试的时间（指数退避）。
+
+运行 `python retry_queue.py drain` 并发重试已到期的论文，成功的论文放入PDF存储、
+写入数据库和文件清单后移出队列；`python retry_queue.py list` 查看队列内容。
+多次失败达到MAX_ATTEMPTS的论文不再自动重试，可用 `drain --all` 强制重试。
+
+多个进程同时写队列时，save()在文件锁内重新读取队列并只合并本进程的改动。
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from tqdm import tqdm
+
+import file_manifest
+import paper_db
+import pdf_fetcher
+import pdf_store
+import rate_limiter
+from file_lock import FileLock
+
+QUEUE_SUFFIX = ".retry.json"    # 重试队列文件后缀（与数据库文件同名）
+LOCK_SUFFIX = ".lock"
+RETRY_BASE_DELAY = 300          # 第一次失败后的等待时间（秒），之后每次翻倍
+RETRY_MAX_DELAY = 24 * 3600     # 最长等待时间（秒）
+MAX_ATTEMPTS = 8                # 达到该次数后不再自动重试
+DRAIN_WORKERS = 8               # 重试时的并发下载数
+
+def queue_path_for(db_path: str) -> str:
+    """数据库对应的重试队列路径，如 papers_db.json -> papers_db.retry.json"""
+    return os.path.splitext(db_path)[0] + QUEUE_SUFFIX
+
+def retry_delay(attempts: int) -> float:
+    """失败attempts次后到下次重试的等待时间"""
+    return rate_limiter.backoff_delay(attempts - 1, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY)
+
+def _now_str() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class RetryQueue:
+    """
+    下载失败重试队列
+
+    以数据库键为队列键，文件路径相对于队列文件所在目录保存，使用正斜杠分隔。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self._lock = FileLock(path + LOCK_SUFFIX)
+        self._data = None
+        # 尚未保存的改动：新的失败记录，或为None表示移出队列
+        self._updates: Dict[str, Optional[Dict]] = {}
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, "/")
+
+    def abspath(self, relpath: str) -> str:
+        """队列中的相对路径对应的实际路径"""
+        return os.path.join(self.base_dir, *relpath.split("/"))
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        return data
+
+    @staticmethod
+    def _apply(data: Dict, updates: Dict):
+        for paper_id, entry in updates.items():
+            if entry is None:
+                data.pop(paper_id, None)
+            else:
+                data[paper_id] = entry
+
+    @property
+    def data(self) -> Dict:
+        """队列内容（首次访问时加载，并包含尚未保存的改动）"""
+        if self._data is None:
+            self._data = self._read()
+            self._apply(self._data, self._updates)
+        return self._data
+
+    def fail(self, paper_id: str, url: str, filepath: str, record: Dict, error: Exception,
+             source: str, replaces: Optional[List[str]] = None):
+        """
+        记录一次下载失败
+
+        参数:
+            paper_id: 数据库键
+            url: PDF地址
+            filepath: 目标文件路径
+            record: 下载成功后写入数据库的记录
+            error: 最后一次下载的异常
+            source: 来源（arxiv、semantic_scholar、arxiv_refresh）
+            replaces: 下载成功后要删除的旧数据库键（如以带版本号的ID为键的旧记录）
+        """
+        previous = self.data.get(paper_id) or {}
+        attempts = previous.get("attempts", 0) + 1
+        entry = {
+            "source": source,
+            "url": url,
+            "filepath": self._relpath(filepath),
+            "record": record,
+            "replaces": replaces or [],
+            "error": type(error).__name__,
+            "message": str(error)[:500],
+            "attempts": attempts,
+            "first_failed": previous.get("first_failed") or _now_str(),
+            "last_failed": _now_str(),
+            "next_attempt": time.time() + retry_delay(attempts)
+        }
+        self._updates[paper_id] = entry
+        self.data[paper_id] = entry
+
+    def resolve(self, paper_id: str):
+        """论文已下载成功，移出队列"""
+        if paper_id in self.data or paper_id in self._updates:
+            self._updates[paper_id] = None
+            self.data.pop(paper_id, None)
+
+    def due(self, include_exhausted: bool = False, now: Optional[float] = None) -> List[tuple]:
+        """
+        到了重试时间的论文
+
+        参数:
+            include_exhausted: 是否包括已达到MAX_ATTEMPTS的论文（此时也忽略等待时间）
+        返回:
+            [(数据库键, 队列记录)]，按下次重试时间排序
+        """
+        now = time.time() if now is None else now
+        result = [
+            (paper_id, entry) for paper_id, entry in self.data.items()
+            if include_exhausted or (entry["attempts"] < MAX_ATTEMPTS and entry["next_attempt"] <= now)
+        ]
+        return sorted(result, key=lambda item: item[1]["next_attempt"])
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def save(self):
+        """在文件锁内把本进程的改动合并进磁盘上的队列"""
+        if not self._updates:
+            return
+        with self._lock:
+            data = self._read()
+            self._apply(data, self._updates)
+            paper_db.write_json_atomic(self.path, data)
+        self._data = data
+        self._updates = {}
+
+def _fill_sha256(record: Dict, sha256: Optional[str]) -> Dict:
+    """把下载后得到的sha256写入记录（arXiv记录的版本历史中也要写入）"""
+    record = dict(record, sha256=sha256)
+    versions = record.get("versions")
+    if versions and versions[-1].get("filename") == record.get("filename"):
+        record["versions"] = versions[:-1] + [dict(versions[-1], sha256=sha256)]
+    return record
+
+def _already_downloaded(db, paper_id: str, entry: Dict) -> bool:
+    """论文是否已经通过其他途径下载（如重新搜索、check_papers修复或另一个来源）"""
+    record = entry["record"]
+    existing = db.get(paper_id)
+    if existing and existing.get("sha256") and existing.get("filename") == record.get("filename"):
+        return True
+    other_id = db.find(record.get("identifiers") or [])
+    if other_id and other_id != paper_id:
+        other = db.get(other_id)
+        return bool(other and other.get("sha256"))
+    return False
+
+def drain(db_path: str = "papers_db.json", workers: int = DRAIN_WORKERS,
+          include_exhausted: bool = False) -> tuple:
+    """
+    并发重试队列中到期的下载
+
+    参数:
+        db_path: 数据库路径（队列和文件清单与数据库同名）
+        workers: 并发下载数
+        include_exhausted: 是否也重试已达到MAX_ATTEMPTS的论文
+    返回:
+        tuple: (成功数, 失败数)
+    """
+    retry_queue = RetryQueue(queue_path_for(db_path))
+    due = retry_queue.due(include_exhausted)
+    if not due:
+        print(f"没有到期的重试任务（队列中共 {len(retry_queue)} 篇）")
+        return 0, 0
+
+    db = paper_db.open_paper_store(db_path)
+    manifest = file_manifest.FileManifest(file_manifest.manifest_path_for(db_path))
+    success_count = 0
+    fail_count = 0
+    try:
+        pending = []
+        for paper_id, entry in due:
+            if _already_downloaded(db, paper_id, entry):
+                retry_queue.resolve(paper_id)
+            else:
+                pending.append((paper_id, entry))
+        if len(pending) < len(due):
+            print(f"{len(due) - len(pending)} 篇论文已通过其他途径下载，移出队列")
+        if not pending:
+            return 0, 0
+
+        print(f"正在重试 {len(pending)} 篇论文的下载...")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for paper_id, entry in pending:
+                filepath = retry_queue.abspath(entry["filepath"])
+                # 会话目录可能已被删除
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
+                futures[executor.submit(pdf_fetcher.stream_pdf, entry["url"], filepath)] = (paper_id, entry, filepath)
+
+            # 在主线程中写数据库和清单
+            for future in tqdm(as_completed(futures), total=len(futures), desc="重试进度"):
+                paper_id, entry, filepath = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    retry_queue.fail(paper_id, entry["url"], filepath, entry["record"], e,
+                                     entry["source"], entry.get("replaces"))
+                    fail_count += 1
+                    print(f"\n重试失败 ({type(e).__name__}): {entry['record'].get('title')}")
+                    continue
+
+                sha256 = pdf_store.try_ingest(filepath)
+                db.put(paper_id, _fill_sha256(entry["record"], sha256))
+                replaced = [old_id for old_id in entry.get("replaces") or [] if old_id != paper_id]
+                if replaced:
+                    db.delete_many(replaced)
+                manifest.record(paper_id, filepath)
+                retry_queue.resolve(paper_id)
+                success_count += 1
+    finally:
+        retry_queue.save()
+        manifest.save()
+        db.close()
+
+    print(f"\n重试完成: 成功 {success_count} 篇，失败 {fail_count} 篇，队列中剩余 {len(retry_queue)} 篇")
+    return success_count, fail_count
+
+def list_queue(db_path: str = "papers_db.json"):
+    """打印队列内容"""
+    retry_queue = RetryQueue(queue_path_for(db_path))
+    if not len(retry_queue):
+        print("重试队列为空")
+        return
+    now = time.time()
+    for paper_id, entry in sorted(retry_queue.data.items(), key=lambda item: item[1]["next_attempt"]):
+        if entry["attempts"] >= MAX_ATTEMPTS:
+            status = "已放弃"
+        elif entry["next_attempt"] <= now:
+            status = "可重试"
+        else:
+            status = datetime.fromtimestamp(entry["next_attempt"]).strftime("%m-%d %H:%M") + "后重试"
+        print(f"[{status}] {paper_id} 尝试{entry['attempts']}次 {entry['error']}: "
+              f"{entry['record'].get('title')}")
+    print(f"\n共 {len(retry_queue)} 篇")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="下载失败重试队列")
+    parser.add_argument("--db", default="papers_db.json", help="数据库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="查看队列")
+    drain_parser = subparsers.add_parser("drain", help="并发重试到期的下载")
+    drain_parser.add_argument("--workers", type=int, default=DRAIN_WORKERS, help="并发下载数")
+    drain_parser.add_argument("--all", action="store_true", help="忽略等待时间和尝试次数上限，重试全部论文")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_queue(args.db)
+    elif args.command == "drain":
+        drain(args.db, args.workers, args.all)